@@ -1,9 +1,21 @@
+import asyncio
+import functools
 import logging
+import threading
+from typing import Optional
+import weakref
 
 import redis
+import redis.asyncio
 from pydantic import BaseSettings
 
 FAKE_REDIS_SERVER = None
+# (testing, host, port) -> client, shared by the whole process
+REDIS_CLIENTS = {}
+# event loop -> (testing, host, port) -> client, asyncio connections
+# belong to the loop they were opened in
+ASYNC_REDIS_CLIENTS = weakref.WeakKeyDictionary()
+REDIS_LOCK = threading.Lock()
 
 class Settings(BaseSettings):
     redis_host: str = '127.0.0.1'
@@ -12,6 +24,16 @@ class Settings(BaseSettings):
     log_level: str = 'WARNING'
     test_data_str_min_length: int = 1
     test_data_int_min: int = 1
+    strategy_cache_size: int = 4096
+    file_cache_size: int = 128
+    cache_max_bytes: int = 64 * 2 ** 20  # Of each in-memory cache
+    cache_ttl: Optional[float] = None  # Seconds
+    test_data_corpus: Optional[str] = None  # Directory or "redis"
+    item_cache: Optional[str] = None  # Directory or "redis"
+    ir_cache: Optional[str] = None  # Directory or "redis"
+    seed: Optional[int] = None
+    http_cache: Optional[str] = None  # Directory
+    validate_output: bool = False  # Validate the generated collections
 
     class Config:
         env_file = '.env'
@@ -25,19 +47,61 @@ class Settings(BaseSettings):
         }
 
 
+@functools.lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Settings read once per process, cache_clear() to read them again."""
+    return Settings()
+
+
+def fake_redis_server():
+    import fakeredis
+    global FAKE_REDIS_SERVER
+    if not FAKE_REDIS_SERVER:
+        FAKE_REDIS_SERVER = fakeredis.FakeServer()
+    return FAKE_REDIS_SERVER
+
+
+def _redis_key(settings: Settings) -> tuple:
+    return settings.testing, settings.redis_host, settings.redis_port
+
+
 def redis_handle():
-    settings = Settings().dict()
-    if settings['testing']:
-        import fakeredis
-        global FAKE_REDIS_SERVER
-        if not FAKE_REDIS_SERVER:
-            FAKE_REDIS_SERVER = fakeredis.FakeServer()
-        r = fakeredis.FakeRedis(server=FAKE_REDIS_SERVER)
-    else:
-        r = redis.Redis(
-            host=settings['redis_host'],
-            port=settings['redis_port'],
-        )
+    """The process-wide Redis client, its connections are pooled."""
+    settings = get_settings()
+    key = _redis_key(settings)
+    with REDIS_LOCK:
+        r = REDIS_CLIENTS.get(key)
+        if r is None:
+            if settings.testing:
+                import fakeredis
+                r = fakeredis.FakeRedis(server=fake_redis_server())
+            else:
+                r = redis.Redis(
+                    host=settings.redis_host,
+                    port=settings.redis_port,
+                )
+            REDIS_CLIENTS[key] = r
+    return r
+
+
+def async_redis_handle():
+    """The pooled redis.asyncio client of the running event loop."""
+    settings = get_settings()
+    key = _redis_key(settings)
+    clients = ASYNC_REDIS_CLIENTS.setdefault(
+        asyncio.get_running_loop(), {},
+    )
+    r = clients.get(key)
+    if r is None:
+        if settings.testing:
+            import fakeredis.aioredis
+            r = fakeredis.aioredis.FakeRedis(server=fake_redis_server())
+        else:
+            r = redis.asyncio.Redis(
+                host=settings.redis_host,
+                port=settings.redis_port,
+            )
+        clients[key] = r
     return r
 
 
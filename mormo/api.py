@@ -1,6 +1,12 @@
-from typing import Optional
+from typing import Callable, Optional, Type
 
-from fastapi import FastAPI
+import time
+
+from fastapi import FastAPI, Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
 
 from .convert import OpenAPIToPostman
 from .schema import OpenAPISchemaToPostmanRequest, TestConfig, TestResult
@@ -11,42 +17,118 @@ from .schema.openapi_v3 import OpenAPISchemaV3
 from .schema.postman_collection_v2 import (
     Collection,
 )
-from .util import load_db, save_db
-from . import logger
+from .profile import profiling
+from .util import load_db_async, save_db_async
+from . import logger, metrics
 
 app = FastAPI(version='0.7.47')
+# Options naming paths on the server, only taken from Settings, and jobs,
+# forking from the threadpool's threads risks deadlocking the workers
+SERVER_OPTIONS = (
+    'item_cache', 'http_cache', 'ir_cache', 'test_data_corpus', 'jobs',
+)
+
+
+def encode_response(response_model: Type[BaseModel], content) -> JSONResponse:
+    """The response FastAPI makes of content for an endpoint's model."""
+    if isinstance(content, BaseModel):
+        content = content.to_dict(no_empty=False)
+    return JSONResponse(jsonable_encoder(response_model.validate(content)))
+
+
+async def respond(
+    response_model: Type[BaseModel], content: Callable, headers=None,
+) -> JSONResponse:
+    """Build the response to content() in the threadpool.
+
+    FastAPI validates and encodes what async endpoints return on the
+    event loop, a large schema or collection would block other requests.
+    """
+    response = await run_in_threadpool(
+        lambda: encode_response(response_model, content()),
+    )
+    response.headers.update(headers or {})
+    return response
+
+
+@app.middleware('http')
+async def observe_request(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get('route')
+    metrics.REQUEST_DURATION.observe(
+        request.method,
+        getattr(route, 'path', 'unmatched'),
+        response.status_code,
+        value=time.perf_counter() - start,
+    )
+    return response
+
+
+@app.get('/metrics')
+async def get_metrics() -> Response:
+    """Metrics in the Prometheus text format."""
+    return Response(
+        metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE,
+    )
 
 
 @app.post("/schema", response_model=SaveOpenAPISchema)
-def new_schema(o: OpenAPISchemaV3) -> SaveOpenAPISchema:
+async def new_schema(o: OpenAPISchemaV3) -> SaveOpenAPISchema:
     """New Schema."""
     logger.debug("NEW SCHEMA")
-    return save_db(o).to_dict()
+    saved = await save_db_async(o)
+    return await respond(SaveOpenAPISchema, saved.to_dict)
 
 
 @app.get('/schema/{digest}', response_model=OpenAPISchemaV3)
-def get_schema(digest: str) -> OpenAPISchemaV3:
-    return load_db(digest)
+async def get_schema(digest: str) -> OpenAPISchemaV3:
+    schema = await load_db_async(digest)
+    return await respond(OpenAPISchemaV3, lambda: schema)
+
+
+def client_request(
+    o: OpenAPISchemaToPostmanRequest,
+) -> OpenAPISchemaToPostmanRequest:
+    """o without the options a client mustn't set."""
+    return o.copy(update=dict.fromkeys(SERVER_OPTIONS))
+
+
+def convert(**kwargs):
+    """Run a profiled conversion, off the event loop in the threadpool."""
+    with profiling() as profiler, OpenAPIToPostman(**kwargs) as oapipm:
+        collection = oapipm.to_postman_collection_v2()
+    return oapipm, collection, profiler
 
 
 @app.post("/schema/{digest}/to_postman", response_model=SaveCollection)
-def schema_to_postman(
+async def schema_to_postman(
     digest: str, o: Optional[OpenAPISchemaToPostmanRequest] = None,
 ) -> SaveCollection:
     """Convert schema to Collection."""
     if o:
-        kwargs = o.to_dict()
+        kwargs = client_request(o).to_dict()
     else:
         kwargs = {}
-    kwargs['schema_'] = load_db(digest)
-    o = OpenAPIToPostman(**kwargs).to_postman_collection_v2()
-    return save_db(o).to_dict()
+    schema = await load_db_async(digest)
+    # Stored models are loaded without validation, validated when converted
+    kwargs['schema_'] = await run_in_threadpool(
+        schema.to_dict, no_empty=False,
+    )
+    _, o, profiler = await run_in_threadpool(convert, **kwargs)
+    metrics.observe_profile(profiler.report())
+    saved = await save_db_async(o)
+    return await respond(
+        SaveCollection, saved.to_dict,
+        headers={'Server-Timing': profiler.server_timing()},
+    )
 
 
 @app.get("/postman/{digest}", response_model=Collection)
-def get_postman(digest: str) -> Collection:
+async def get_postman(digest: str) -> Collection:
     """Get Postman Collection by ID."""
-    return load_db(digest)
+    collection = await load_db_async(digest)
+    return await respond(Collection, lambda: collection)
 
 
 def run_postman_collection(
@@ -60,20 +142,29 @@ def run_postman_collection(
 
 
 @app.get("/postman/{digest}/test", response_model=TestResult)
-def run_postman_test(
+async def run_postman_test(
     digest: str, host: str, verbose: Optional[bool] = False,
 ) -> TestResult:
     """Create a new test run from a postman collection."""
-    return run_postman_collection(load_db(digest), host=host, verbose=verbose)
+    return await run_in_threadpool(
+        run_postman_collection,
+        await load_db_async(digest), host=host, verbose=verbose,
+    )
 
 
 @app.post('/run/test/from_schema', response_model=TestResult)
-def run_test_run_from_schema(o: OpenAPISchemaToPostmanRequest) -> TestResult:
+async def run_test_run_from_schema(
+    o: OpenAPISchemaToPostmanRequest, response: Response,
+) -> TestResult:
     """Create a new test run from OpenAPI Schema."""
-    from .convert import OpenAPIToPostman
-    oapipm = OpenAPIToPostman(o)
-    return run_postman_collection(
-        oapipm.to_postman_collection_v2(),
+    oapipm, collection, profiler = await run_in_threadpool(
+        convert, request=client_request(o),
+    )
+    response.headers['Server-Timing'] = profiler.server_timing()
+    metrics.observe_profile(profiler.report())
+    return await run_in_threadpool(
+        run_postman_collection,
+        collection,
         host=oapipm.host,
         verbose=oapipm.verbose,
     )
@@ -0,0 +1,161 @@
+from collections import namedtuple
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import time
+from typing import List, Optional
+
+from .codec import format_from_path
+from .convert import OpenAPIToPostman
+from .schema.postman_collection_v2 import write_collection
+
+Regression = namedtuple('Regression', ['spec', 'metric', 'baseline', 'value'])
+
+# Stages of a conversion in the order they run
+STAGES = ['load', 'items', 'write']
+
+
+def find_specs(corpus: str) -> List[str]:
+    """JSON and YAML files in corpus, recursively and in a stable order."""
+    if os.path.isfile(corpus):
+        return [corpus]
+    specs = []
+    for root, dirs, files in os.walk(corpus):
+        dirs.sort()
+        specs.extend(
+            os.path.join(root, name) for name in sorted(files)
+            if format_from_path(name)
+        )
+    return specs
+
+
+def bench_spec(path: str, **kwargs) -> dict:
+    """Convert the spec at path timing each stage, in this process."""
+    stages = {}
+    start = last = time.perf_counter()
+
+    def stage(name):
+        nonlocal last
+        now = time.perf_counter()
+        stages[name] = now - last
+        last = now
+
+    oas = OpenAPIToPostman(path=path, **kwargs)
+    stage('load')
+    global_variables = []
+    items = list(oas.iter_postman_items(global_variables))
+    stage('items')
+    with open(os.devnull, 'w') as f:
+        write_collection(
+            f, items, oas.collection_info(),
+            event=oas.collection_events(),
+            variable=oas.collection_variables(global_variables),
+        )
+    stage('write')
+    return {
+        'wall': last - start,
+        'stages': stages,
+        'items': len(items),
+        # Kilobytes on Linux
+        'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def _bench_child(conn, path, kwargs):
+    try:
+        conn.send(bench_spec(path, **kwargs))
+    except Exception as e:
+        conn.send({'error': f'{type(e).__name__}: {e}'})
+    finally:
+        conn.close()
+
+
+def bench_spec_isolated(path: str, timeout: float = 300, **kwargs) -> dict:
+    """bench_spec in a new process so max_rss is the spec's own peak."""
+    parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+    proc = multiprocessing.Process(
+        target=_bench_child, args=(child_conn, path, kwargs), daemon=True,
+    )
+    proc.start()
+    child_conn.close()
+    if parent_conn.poll(timeout):
+        try:
+            result = parent_conn.recv()
+        except EOFError:
+            result = {'error': f'Exited with {proc.exitcode}'}
+    else:
+        proc.terminate()
+        result = {'error': f'Timed out after {timeout}s'}
+    proc.join()
+    return result
+
+
+def run_bench(
+    specs: List[str], timeout: float = 300, isolated: bool = True, **kwargs,
+) -> dict:
+    """Benchmark the conversion of each spec, returning the report."""
+    results = {}
+    for path in specs:
+        if isolated:
+            results[path] = bench_spec_isolated(
+                path, timeout=timeout, **kwargs,
+            )
+        else:
+            try:
+                results[path] = bench_spec(path, **kwargs)
+            except Exception as e:
+                results[path] = {'error': f'{type(e).__name__}: {e}'}
+    converted = [r for r in results.values() if 'error' not in r]
+    return {
+        'created': time.time(),
+        'python': platform.python_version(),
+        'options': kwargs,
+        'specs': results,
+        'total': {
+            'specs': len(results),
+            'errors': len(results) - len(converted),
+            'wall': sum(r['wall'] for r in converted),
+            'stages': {
+                name: sum(r['stages'][name] for r in converted)
+                for name in STAGES
+            },
+        },
+    }
+
+
+def compare(
+    report: dict, baseline: dict, threshold: float = 0.2,
+    min_wall: float = 0.05,
+) -> List[Regression]:
+    """Specs slower, bigger or failing compared to baseline.
+
+    wall and max_rss regress when they grow by more than threshold (a
+    fraction); wall differences under min_wall seconds are noise.
+    """
+    regressions = []
+    for spec, base in baseline['specs'].items():
+        result = report['specs'].get(spec)
+        if result is None or 'error' in base:
+            continue
+        if 'error' in result:
+            regressions.append(
+                Regression(spec, 'error', None, result['error']),
+            )
+            continue
+        for metric, floor in (('wall', min_wall), ('max_rss', 0)):
+            old, new = base[metric], result[metric]
+            if new > old * (1 + threshold) and new - old > floor:
+                regressions.append(Regression(spec, metric, old, new))
+    return regressions
+
+
+def load_report(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_report(report: dict, path: Optional[str]):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
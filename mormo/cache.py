@@ -0,0 +1,217 @@
+from collections import OrderedDict
+import itertools
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from . import logger, redis_handle
+
+# Name -> LRUCache of the caches that report stats and honour scopes
+CACHES: Dict[str, 'LRUCache'] = {}
+_SCOPE_IDS = itertools.count(1)
+_MISSING = object()
+
+
+def approximate_size(o) -> int:
+    """Bytes used by o and the containers and strings it holds.
+
+    Other objects are only counted shallowly.
+    """
+    seen, size, stack = set(), 0, [o]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+    return size
+
+
+def new_scope() -> int:
+    """An id for entries that are only kept while their owner is alive."""
+    return next(_SCOPE_IDS)
+
+
+def release_scope(scope: int):
+    """Drop the entries of every registered cache only used by scope."""
+    for cache in list(CACHES.values()):
+        cache.release(scope)
+
+
+def cache_stats() -> Dict[str, dict]:
+    return {name: cache.stats() for name, cache in CACHES.items()}
+
+
+class LRUCache:
+    """Thread safe mapping evicting the least recently used entries.
+
+    Bounded to maxsize entries and, when set, maxbytes bytes as measured
+    by sizeof(key, value). Entries expire ttl seconds after being set.
+    Entries set or read under a scope are dropped once every scope using
+    them is released (see release_scope); entries set without one are
+    only evicted. Named caches are registered for cache_stats.
+    """
+
+    def __init__(
+        self, maxsize: int = 1024, maxbytes: Optional[int] = None,
+        ttl: Optional[float] = None, name: Optional[str] = None,
+        sizeof: Optional[Callable[[Hashable, Any], int]] = None,
+    ):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.name = name
+        self.sizeof = sizeof or (
+            lambda key, value: approximate_size(key) + approximate_size(value)
+        )
+        # key -> [value, bytes, expires, scopes]
+        self.data = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.RLock()
+        self.hits, self.misses, self.evictions, self.expirations = 0, 0, 0, 0
+        if name:
+            CACHES[name] = self
+
+    def _pop(self, key):
+        entry = self.data.pop(key)
+        self.bytes -= entry[1]
+        return entry
+
+    def get(self, key, default=None, scope: Optional[int] = None) -> Any:
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is not None and entry[2] and entry[2] < time.monotonic():
+                self._pop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            if scope is not None and entry[3] is not None:
+                entry[3].add(scope)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, scope: Optional[int] = None):
+        size = self.sizeof(key, value)
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self.lock:
+            if key in self.data:
+                self._pop(key)
+            if self.maxbytes and size > self.maxbytes:
+                logger.debug(f"Not caching a {size} byte value in {self.name}")
+                return
+            scopes = None if scope is None else {scope}
+            self.data[key] = [value, size, expires, scopes]
+            self.bytes += size
+            while len(self.data) > self.maxsize or (
+                self.maxbytes and self.bytes > self.maxbytes
+            ):
+                self._pop(next(iter(self.data)))
+                self.evictions += 1
+
+    def release(self, scope: int):
+        with self.lock:
+            for key, entry in list(self.data.items()):
+                if entry[3] is not None and scope in entry[3]:
+                    entry[3].discard(scope)
+                    if not entry[3]:
+                        self._pop(key)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'size': len(self.data),
+                'maxsize': self.maxsize,
+                'bytes': self.bytes,
+                'maxbytes': self.maxbytes or 0,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.bytes = 0
+            self.hits, self.misses, self.evictions = 0, 0, 0
+            self.expirations = 0
+
+
+class MemoryStore:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.data.get(key)
+
+    def has(self, key: str) -> bool:
+        return key in self.data
+
+    def set(self, key: str, value: bytes):
+        self.data[key] = value
+
+
+class FileStore:
+    """One file per key in a local directory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.path, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def has(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def set(self, key: str, value: bytes):
+        # Write then rename so concurrent readers never see partial values
+        tmp = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(value)
+        os.replace(tmp, self._path(key))
+
+
+class RedisStore:
+    def __init__(self, r, prefix: str, ttl: int = 60 * 60 * 24 * 7):
+        self.r = r
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.r.get(f'{self.prefix}:{key}')
+
+    def has(self, key: str) -> bool:
+        return bool(self.r.exists(f'{self.prefix}:{key}'))
+
+    def set(self, key: str, value: bytes):
+        self.r.setex(f'{self.prefix}:{key}', self.ttl, value)
+
+
+def store_from_uri(uri: Optional[str], namespace: str):
+    """Get a store for uri, either "redis" or a local directory."""
+    if not uri:
+        return
+    if uri == 'redis':
+        store = RedisStore(redis_handle(), prefix=f'mormo:{namespace}')
+    else:
+        store = FileStore(os.path.join(uri, namespace))
+    logger.debug(f"Using {type(store).__name__} for {namespace}")
+    return store
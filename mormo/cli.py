@@ -11,7 +11,9 @@ import uvicorn
 
 from mormo.api import app
 from mormo.convert import OpenAPIToPostman
-from mormo.postman_test import run_newman
+from mormo.fetch import Fetcher
+from mormo.postman_test import run_newman_shards
+from mormo.profile import Profiler, profiling
 
 
 @click.group()
@@ -26,10 +28,14 @@ def api():
 
 
 def generate_schema(infile, outfile, test_file, **kwargs):
-    oas = OpenAPIToPostman(path=infile, test_data_file=test_file, **kwargs)
-    postman_collection = oas.to_postman_collection_v2()
-    with open(outfile, 'w') as f:
-        json.dump(postman_collection.to_dict(), f)
+    with OpenAPIToPostman(
+        path=infile, test_data_file=test_file, **kwargs,
+    ) as oas:
+        if oas.shards:
+            return oas.write_postman_collection_shards(outfile)
+        with open(outfile, 'w') as f:
+            oas.write_postman_collection_v2(f)
+    return [outfile]
 
 
 @cli.command()
@@ -46,7 +52,45 @@ def generate_schema(infile, outfile, test_file, **kwargs):
 @click.option('--host', 'host', help='Target API')
 @click.option('--verbose', is_flag=True,
               help='Verbose option in newman.')
-def run(in_file, test_file, out_file, test, test_mormo_api, host, verbose):
+@click.option('--shared_components', is_flag=True,
+              help='Register referenced component schemas once per'
+                   ' collection.')
+@click.option('--item_cache', 'item_cache',
+              help='Reuse items of unchanged routes from a directory or'
+                   ' "redis".')
+@click.option('--http_cache', 'http_cache', type=click.Path(),
+              help='Directory to cache remote references in.')
+@click.option('--ir_cache', 'ir_cache',
+              help='Reuse the resolved operations of an unchanged schema from'
+                   ' a directory or "redis".')
+@click.option('-j', '--jobs', 'jobs', type=int,
+              help='Number of processes to generate route items with.')
+@click.option('--seed', 'seed', type=int,
+              help='Seed for reproducible test data and ids.')
+@click.option('--include_path', 'include_paths', multiple=True,
+              help='Only convert paths matching this glob (repeatable).')
+@click.option('--include_tag', 'include_tags', multiple=True,
+              help='Only convert operations with this tag (repeatable).')
+@click.option('--lazy_validation', is_flag=True,
+              help='Validate paths of the schema as they are converted.')
+@click.option('--streaming', is_flag=True,
+              help='Parse a JSON schema incrementally, keeping the included'
+                   ' paths.')
+@click.option('--folders', 'folders', type=click.Choice(['tag', 'resource']),
+              help='Group requests into folders by tag or resource.')
+@click.option('--shards', 'shards',
+              help='Write N balanced collections, or "folder" for one per'
+                   ' folder.')
+@click.option('--profile', 'profile', is_flag=True,
+              help='Print the time spent in each stage of the conversion.')
+@click.option('--profile_out', 'profile_out', type=click.Path(),
+              help='Also write a cProfile (pstats) dump of the conversion.')
+def run(
+    in_file, test_file, out_file, test, test_mormo_api, host, verbose,
+    shared_components, item_cache, http_cache, ir_cache, jobs, seed,
+    include_paths, include_tags, lazy_validation, streaming, folders, shards,
+    profile, profile_out,
+):
     """Generate Postman Collections."""
     if not out_file:
         temp = tempfile.NamedTemporaryFile()
@@ -69,9 +113,23 @@ def run(in_file, test_file, out_file, test, test_mormo_api, host, verbose):
         time.sleep(1)
         with open(in_file, 'w') as f:
             json.dump(requests.get(f'{host}/openapi.json').json(), f)
-    generate_schema(in_file, out_file, test_file, host=host, verbose=verbose)
+    profiler = Profiler(cprofile=bool(profile_out))
+    with profiling(profiler):
+        out_files = generate_schema(
+            in_file, out_file, test_file, host=host, verbose=verbose,
+            shared_schema_components=shared_components, item_cache=item_cache,
+            http_cache=http_cache, ir_cache=ir_cache, jobs=jobs, seed=seed,
+            include_paths=list(include_paths) or None,
+            include_tags=list(include_tags) or None,
+            lazy_validation=lazy_validation, streaming=streaming,
+            folders=folders, shards=shards,
+        )
+    if profile or profile_out:
+        click.echo(profiler.format(), err=True)
+    if profile_out:
+        profiler.dump_stats(profile_out)
     if test:
-        res = run_newman(out_file, host=host, verbose=verbose)
+        res = run_newman_shards(out_files, host=host, verbose=verbose)
         if test_mormo_api:
             proc.terminate()
         sys.exit(res.code)
@@ -93,7 +151,57 @@ def run(in_file, test_file, out_file, test, test_mormo_api, host, verbose):
 @click.option(
     '-v', '--verbose', is_flag=True, help='verbose option in newman.',
 )
-def test(test_config, target, test_mormo_api, verbose):
+@click.option(
+    '--shared_components', is_flag=True,
+    help='register referenced component schemas once per collection',
+)
+@click.option(
+    '--item_cache', 'item_cache',
+    help='reuse items of unchanged routes from a directory or "redis"',
+)
+@click.option(
+    '--http_cache', 'http_cache', type=click.Path(),
+    help='directory to cache the target schema and remote references in',
+)
+@click.option(
+    '--ir_cache', 'ir_cache',
+    help='reuse the resolved operations of an unchanged schema from a'
+         ' directory or "redis"',
+)
+@click.option(
+    '-j', '--jobs', 'jobs', type=int,
+    help='number of processes to generate route items with',
+)
+@click.option(
+    '--seed', 'seed', type=int,
+    help='seed for reproducible test data and ids',
+)
+@click.option(
+    '--include_path', 'include_paths', multiple=True,
+    help='only test paths matching this glob (repeatable)',
+)
+@click.option(
+    '--include_tag', 'include_tags', multiple=True,
+    help='only test operations with this tag (repeatable)',
+)
+@click.option(
+    '--lazy_validation', is_flag=True,
+    help='validate paths of the schema as they are converted',
+)
+@click.option(
+    '--folders', 'folders', type=click.Choice(['tag', 'resource']),
+    help='group requests into folders by tag or resource',
+)
+@click.option(
+    '--shards', 'shards',
+    help='run N balanced collections, or "folder" for one per folder,'
+         ' in parallel',
+)
+def test(
+    test_config, target, test_mormo_api, verbose, shared_components,
+    item_cache, http_cache, ir_cache, jobs, seed, include_paths,
+    include_tags, lazy_validation, folders, shards,
+):
     """Run Mormo Tests."""
     temp_out = tempfile.NamedTemporaryFile(suffix='.json')
     temp_in = tempfile.NamedTemporaryFile(suffix='.json')
@@ -117,13 +225,104 @@ def test(test_config, target, test_mormo_api, verbose):
         proc.start()
         time.sleep(1)
     with open(in_file, 'w') as f:
-        json.dump(requests.get(target).json(), f)
-    generate_schema(in_file, out_file, test_config, host=host, verbose=verbose)
-    res = run_newman(out_file, host=host, verbose=verbose)
+        with Fetcher(cache_dir=http_cache) as fetcher:
+            json.dump(fetcher.load(target), f)
+    out_files = generate_schema(
+        in_file, out_file, test_config, host=host, verbose=verbose,
+        shared_schema_components=shared_components, item_cache=item_cache,
+        http_cache=http_cache, ir_cache=ir_cache, jobs=jobs, seed=seed,
+        include_paths=list(include_paths) or None,
+        include_tags=list(include_tags) or None,
+        lazy_validation=lazy_validation, folders=folders, shards=shards,
+    )
+    res = run_newman_shards(out_files, host=host, verbose=verbose)
     if test_mormo_api:
         proc.terminate()
     sys.exit(res.code)
 
 
+@cli.command()
+@click.option('-d', '--corpus', 'corpus', type=click.Path(exists=True),
+              default='tests/data/openapi/json',
+              help='Spec or directory of specs (JSON or YAML) to convert.')
+@click.option('-o', '--out', 'out_file', type=click.Path(),
+              help='Path to write the JSON report to.')
+@click.option('--baseline', 'baseline', type=click.Path(exists=True),
+              help='Report to compare with, exits 1 on regressions.')
+@click.option('--threshold', 'threshold', type=float, default=0.2,
+              help='Fraction wall time or peak RSS may grow by.')
+@click.option('--timeout', 'timeout', type=float, default=300,
+              help='Seconds before a spec is given up on.')
+@click.option('--seed', 'seed', type=int, default=0,
+              help='Seed for the generated test data.')
+@click.option('--synthetic', 'synthetic',
+              help='Benchmark generated specs with these comma separated path'
+                   ' counts instead of a corpus (e.g. 10,100,1000).')
+def bench(corpus, out_file, baseline, threshold, timeout, seed, synthetic):
+    """Benchmark conversion of a corpus of specs."""
+    from mormo.bench import (
+        compare, find_specs, load_report, run_bench, write_report, STAGES,
+    )
+    if synthetic:
+        from mormo.synthetic import generate_spec
+        corpus = tempfile.mkdtemp()
+        for paths in map(int, synthetic.split(',')):
+            spec = generate_spec(
+                paths=paths, components=max(1, paths // 2), seed=seed,
+            )
+            with open(f'{corpus}/synthetic-{paths:06d}.json', 'w') as f:
+                json.dump(spec, f)
+    report = run_bench(find_specs(corpus), timeout=timeout, seed=seed)
+    for spec, result in report['specs'].items():
+        if 'error' in result:
+            click.echo(f"{spec}: {result['error']}")
+            continue
+        stages = ' '.join(
+            f"{name}={result['stages'][name]:.3f}s" for name in STAGES
+        )
+        click.echo(
+            f"{spec}: {result['wall']:.3f}s ({stages})"
+            f" max_rss={result['max_rss'] // 1024}MB items={result['items']}"
+        )
+    total = report['total']
+    click.echo(
+        f"{total['specs']} specs, {total['errors']} errors,"
+        f" {total['wall']:.3f}s"
+    )
+    if out_file:
+        write_report(report, out_file)
+    if baseline:
+        regressions = compare(report, load_report(baseline), threshold)
+        for r in regressions:
+            click.echo(
+                f"REGRESSION {r.spec} {r.metric}: {r.baseline} -> {r.value}",
+            )
+        sys.exit(1 if regressions else 0)
+
+
+@cli.command()
+@click.option('-o', '--out', 'out_file', type=click.Path(), required=True,
+              help='Path to write the generated OpenAPI Schema to.')
+@click.option('--paths', 'paths', type=int, default=100,
+              help='Number of paths.')
+@click.option('--verbs', 'verbs_per_path', type=int, default=2,
+              help='Operations per path (1-5).')
+@click.option('--components', 'components', type=int, default=50,
+              help='Number of component schemas.')
+@click.option('--fanout', 'ref_fanout', type=int, default=2,
+              help='References from each component to other components.')
+@click.option('--depth', 'depth', type=int, default=1,
+              help='Length of allOf chains between components.')
+@click.option('--cycle_ratio', 'cycle_ratio', type=float, default=0.0,
+              help='Fraction of components referencing themselves.')
+@click.option('--seed', 'seed', type=int, default=0,
+              help='The same seed and options generate the same schema.')
+def synthetic(out_file, **kwargs):
+    """Generate an OpenAPI Schema for scale testing."""
+    from mormo.synthetic import generate_spec
+    with open(out_file, 'w') as f:
+        json.dump(generate_spec(**kwargs), f)
+
+
 if __name__ == "__main__":
     cli()
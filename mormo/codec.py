@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+import gc
+import json
+import os
+from typing import Any, Optional, Union
+
+import yaml
+
+from . import logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# libyaml bindings are an order of magnitude faster when PyYAML has them
+YAMLLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+EXTENSIONS = {
+    '.json': 'json',
+    '.yaml': 'yaml',
+    '.yml': 'yaml',
+}
+DECODE_ERRORS = (yaml.YAMLError, json.decoder.JSONDecodeError)
+
+
+@contextmanager
+def gc_paused():
+    """Pause the cyclic GC while decoding a document.
+
+    Decoding allocates many objects without creating garbage, letting
+    the GC rescan them over and over makes it several times slower.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def loads_json(content: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # orjson is stricter (e.g. integers over 64 bits), let json decide
+            pass
+    return json.loads(content)
+
+
+def loads_yaml(content: Union[str, bytes]) -> Any:
+    return yaml.load(content, Loader=YAMLLoader)
+
+
+LOADERS = {
+    'json': loads_json,
+    'yaml': loads_yaml,
+}
+
+
+def detect_format(content: Union[str, bytes]) -> str:
+    """Guess json or yaml from the first character of content."""
+    if isinstance(content, bytes):
+        content = content[:64].decode('utf-8', 'ignore')
+    return 'json' if content.lstrip()[:1] in ('{', '[') else 'yaml'
+
+
+def loads(content: Union[str, bytes], content_type: Optional[str] = None):
+    """Decode a JSON or YAML document, trying the other format on failure."""
+    content_type = content_type or detect_format(content)
+    try:
+        with gc_paused():
+            return LOADERS[content_type](content)
+    except DECODE_ERRORS as e:
+        other = 'yaml' if content_type == 'json' else 'json'
+        logger.debug(f"Not {content_type}, loading as {other}: {e}")
+        with gc_paused():
+            return LOADERS[other](content)
+
+
+def format_from_path(path: str) -> Optional[str]:
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def load_file(path: str, content_type: Optional[str] = None) -> Any:
+    content_type = content_type or format_from_path(path)
+    if not content_type:
+        raise ValueError(f"Unknown file type: {path}")
+    with open(path, 'rb') as f:
+        content = f.read()
+    with gc_paused():
+        return LOADERS[content_type](content)
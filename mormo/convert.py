@@ -1,18 +1,21 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import os
-from collections import defaultdict, ChainMap, Counter, namedtuple
+from collections import defaultdict, ChainMap, namedtuple
 from typing import Generator, Iterable, List, Tuple, Optional
+import hashlib
 import json
+import random
 import re
-import requests
-import yaml
+import weakref
 
 from .postman_test import (
     new_event, javascript, js_test_code,
     js_test_content_type, js_test_response_time,
-    js_test_validate_schema,
+    js_test_validate_schema, js_test_validate_schema_from_variable,
 )
 from .schema import (
-    Expect, OpenAPISchemaToPostmanRequest, PostmanTest,
+    Expect, FolderBy, OpenAPISchemaToPostmanRequest, PostmanTest,
     TestData, TestConfig,
     list_of_test_data_to_params,
 )
@@ -22,24 +25,41 @@ from .schema.openapi_v3 import (
     ParameterRequestData, Reference, SchemaObject,
 )
 from .schema.postman_collection_v2 import (
-    Auth, Collection, Item,
+    Auth, Collection, Folder, Item,
     Request, RequestBody, Response, OriginalRequest, Header,
-    Info, Description, Parameter, Url, Variable,
+    Info, Description, Mode, Parameter, Url, Variable,
+    write_collection,
 )
 from .util import (
-    blind_load,
     fingerprint, flatten_iterables_in_dict, generate_from_schema,
-    get_http_reason, hashable_lru, is_local_file_path, load_file, pick_one,
-    uuidgen, trim, HTTP_VERBS,
+    get_http_reason, is_local_file_path, iter_refs, json_pointer_index,
+    load_file, load_file_cached, new_cache, pick_one, uuidgen, trim,
+    unescape_json_pointer, HTTP_VERBS,
 )
-from . import logger
+from .cache import new_scope, release_scope, store_from_uri
+from .codec import format_from_path, gc_paused, loads, loads_json
+from .fetch import Fetcher
+from .stream import filter_paths, load_spec_subset
+from . import get_settings, logger, profile, Settings
 
 RE_PATH_VARIABLE = re.compile(r'\{(.*?)\}')  # noqa: W605
 RE_PATH_GLOBAL_VARIABLE = re.compile(r'\{\{(.*?)\}\}')  # noqa: W605
 RE_PATH_VARIABLE_SEGMENT = re.compile(r'(\(\{(.*?)\}\))')  # noqa: W605
 RE_PATH_CONVERTED_VARIABLE_SEGMENT = re.compile(r'(\{\{(.*?)\}\})')  # noqa: W605
+SCHEMA_COMPONENTS_VARIABLE = 'mormoSchemaComponents'
+# Bump when the Items generated for an unchanged route change
+ITEM_CACHE_VERSION = 1
+# Bump when OperationIR or how it's normalized changes
+IR_CACHE_VERSION = 2
 
 Route = namedtuple('Route', ['verb', 'path', 'operation'])
+CompiledPath = namedtuple('CompiledPath', [
+    'parts',  # Postman URL path segments
+    'path_vars',  # Names of whole segment variables, /pets/{id}
+    'segment_vars',  # Names of variables within a segment, /pets({id})
+    'variables',  # Every {variable} of the path, in order
+    'resource',
+])
 ReferenceSearch = namedtuple('ReferenceSearch', ['ref', 'schema'])
 PostmanConfig = namedtuple('PostmanConfig', [
     'expect',
@@ -58,6 +78,146 @@ PostmanVariables = namedtuple('PostmanVariables', [
     'body',
 ])
 
+# (OpenAPIToPostman, routes) of the conversion a pool worker builds for
+_POOL_STATE = None
+
+
+PATH_CACHE = new_cache('paths', 4096)
+
+
+def compile_path(path: str) -> CompiledPath:
+    """Parse an OpenAPI path once for every use of it."""
+    compiled = PATH_CACHE.get(path)
+    if compiled is None:
+        compiled = _compile_path(path)
+        PATH_CACHE.set(path, compiled)
+    return compiled
+
+
+def _compile_path(path: str) -> CompiledPath:
+    parts = []
+    for part in path.split('/')[1:]:
+        is_path_variable = re.match(r'^{(\w+)}$', part)  # noqa: W605
+        is_path_segment = RE_PATH_VARIABLE.findall(part)
+        # queries = RE_PATH_VARIABLE_SEGMENT.findall(part)
+        if is_path_variable:
+            part = f':{is_path_variable.group(1)}'
+        elif is_path_segment:
+            for group in is_path_segment:
+                part = part.replace(f"{{{group}}}", f"{{{{{group}}}}}")
+        if '(' in part and ')' in part:
+            part = part.replace('(', '').replace(')', '')
+        parts.append(part)
+    path_vars = tuple(p[1:] for p in parts if p.startswith(':'))
+    variables = tuple(RE_PATH_VARIABLE.findall(path))
+    return CompiledPath(
+        parts=tuple(parts),
+        path_vars=path_vars,
+        segment_vars=tuple(sorted(set(variables).difference(path_vars))),
+        variables=variables,
+        resource=guess_resource(parts),
+    )
+
+
+def guess_resource(parts) -> Optional[str]:
+    """The last segment of a path, before a trailing variable."""
+    last_part = None
+    for i, part in enumerate(parts):
+        is_variable = RE_PATH_GLOBAL_VARIABLE.match(part)\
+            or part.startswith(':')
+        segments = RE_PATH_CONVERTED_VARIABLE_SEGMENT.findall(part)
+        for segment, var in segments:
+            part = part.replace(segment, '')
+        # If this segment is a variable, return the last one
+        if is_variable and len(parts) - i == 1:
+            return last_part
+        last_part = part
+    return last_part
+
+
+class RouteRecord:
+    """An operation of the schema with its path compiled.
+
+    Unpacks like a Route: verb, path, operation = record
+    """
+    __slots__ = (
+        'verb', 'path', 'operation', 'route',
+        'parts', 'path_vars', 'segment_vars', 'variables', 'resource',
+    )
+
+    def __init__(self, verb: str, path: str, operation: Operation):
+        self.verb, self.path, self.operation = verb, path, operation
+        self.route = f'{verb.upper()} {path}'
+        (
+            self.parts, self.path_vars, self.segment_vars, self.variables,
+            self.resource,
+        ) = compile_path(path)
+
+    def __iter__(self):
+        return iter((self.verb, self.path, self.operation))
+
+    def __repr__(self):
+        return f'RouteRecord({self.route})'
+
+
+class OperationIR(namedtuple('OperationIR', [
+    'operation',
+    'parameters',  # Resolved Parameters
+    'request_body',  # Resolved RequestBody or None
+    'request_body_properties',  # ((mimetype, ((name, schema), ...)), ...)
+    'responses',  # ((code, resolved Response), ...)
+])):
+    """An Operation with its references resolved, built once per operation.
+
+    Shares resolved nodes with every other use of a reference, treat as
+    read-only.
+    """
+    __slots__ = ()
+
+    def parameters_in(self, in_: str) -> tuple:
+        return tuple(p for p in self.parameters if p.in_.value == in_)
+
+    def to_dict(self) -> dict:
+        return {
+            'operation': self.operation.to_dict(no_empty=False),
+            'parameters': [p.to_dict(no_empty=False) for p in self.parameters],
+            'request_body': self.request_body.to_dict(no_empty=False)
+            if self.request_body else None,
+            'request_body_properties': self.request_body_properties,
+            'responses': [
+                (code, response.to_dict(no_empty=False))
+                for code, response in self.responses
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'OperationIR':
+        """Validate an OperationIR read back from to_dict."""
+        return cls(
+            Operation.parse_obj(d['operation']),
+            tuple(oapi.Parameter.parse_obj(p) for p in d['parameters']),
+            oapi.RequestBody.parse_obj(d['request_body'])
+            if d['request_body'] else None,
+            tuple(
+                (mimetype, tuple(tuple(p) for p in properties))
+                for mimetype, properties in d['request_body_properties']
+            ),
+            tuple(
+                (code, oapi.Response.parse_obj(response))
+                for code, response in d['responses']
+            ),
+        )
+
+
+def _pool_init(mormo, routes):
+    global _POOL_STATE
+    _POOL_STATE = (mormo, routes)
+
+
+def _pool_build_item(i):
+    mormo, routes = _POOL_STATE
+    return profile.profiled_call(mormo._build_item, *routes[i])
+
 
 class OpenAPIToPostman:
     def __init__(
@@ -67,11 +227,32 @@ class OpenAPIToPostman:
     ):
         if not request:
             request = OpenAPISchemaToPostmanRequest(**kwargs)
+        # Read once, Settings() reads the environment and .env each time
+        self.settings = Settings()
         self.schema = None
         self.host = request.host
-        self.max_ref_depth = 5
-        self.ref_depth = Counter()
+        # Resolved form of each (ref, deep), shared by every use of the ref
+        self.resolved_refs = {}
+        # Refs being resolved, a ref seen twice in it is a cycle
+        self.ref_stack = []
+        # Lowest ref_stack index a cycle placeholder has pointed back to
+        self.ref_cycle_floor = 0
         self.strict = True
+        # Entries this conversion adds to the shared in-memory caches are
+        # dropped when it's closed or garbage collected, unless others use
+        # them
+        self.cache_scope = new_scope()
+        self._release_scope = weakref.finalize(
+            self, release_scope, self.cache_scope,
+        )
+        self._route_table = None
+        # id(Operation) -> OperationIR, the IR references its Operation
+        self.operations_ir = {}
+        self.ir_cache = store_from_uri(
+            request.ir_cache or self.settings.ir_cache, 'ir',
+        )
+        self.ir_cache_key = None
+        self.make_global_routes = []
         self.test_scripts = defaultdict(lambda: [], request.test_scripts or [])
         self.prerequest_scripts = defaultdict(lambda: [], request.prerequest_scripts or [])  # noqa: E501
         self.collection_test_scripts = request.collection_test_scripts or []
@@ -80,49 +261,159 @@ class OpenAPIToPostman:
         self.default_expect = Expect()
         self.expect = request.expect or defaultdict(self.get_default_expect)
         self.verbose = request.verbose
+        self.shared_schema_components = request.shared_schema_components
+        self.item_cache = store_from_uri(
+            request.item_cache or self.settings.item_cache, 'items',
+        )
+        self.jobs = request.jobs
+        self.folders = request.folders
+        self.shards = request.shards
+        self.seed = request.seed if request.seed is not None\
+            else self.settings.seed
+        self.fetcher = Fetcher(
+            cache_dir=request.http_cache or self.settings.http_cache,
+        )
+        self.test_data_corpus = store_from_uri(
+            request.test_data_corpus or self.settings.test_data_corpus,
+            'test_data',
+        )
+        with profile.stage('load'):
+            self.load_schema(request)
+        with profile.stage('index'):
+            self.ref_index = json_pointer_index(
+                self.schema.components, prefix='#/components',
+            )
+        if self.ir_cache_key and not self.operations_ir:
+            self.save_normalized()
+        with profile.stage('test_config'):
+            self.test_data = self.load_test_data(
+                request.test_data or [],
+                request.test_data_file,
+                request.test_config,
+            )
+
+    def close(self):
+        """Release this conversion's cache entries without waiting for GC.
+
+        The instance is in reference cycles, so it's only collected by
+        the cyclic garbage collector. Also closes the fetcher's session.
+        """
+        self._release_scope()
+        self.fetcher.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def load_schema(self, request: OpenAPISchemaToPostmanRequest):
         path = request.path
         schema = request.schema_
         if path:
-            if path.endswith('.json'):
-                self.schema = OpenAPISchemaV3.parse_file(path)
-            elif path.endswith('.yaml') or path.endswith('.yml'):
-                with open(path, "r") as f:
-                    self.schema = yaml.safe_load(f)
-            else:
+            content_type = format_from_path(path)
+            if not content_type:
                 raise ValueError(f"Unknown file type for: {path}")
+            if request.streaming and content_type != 'json':
+                logger.warning(
+                    f"Streaming only parses JSON, loading {path} whole",
+                )
+            if request.streaming and content_type == 'json':
+                self.schema = load_spec_subset(
+                    path, request.include_paths, request.include_tags,
+                )
+            elif self.ir_cache:
+                with open(path, 'rb') as f:
+                    content = f.read()
+                self.ir_cache_key = self.normalized_key(content, request)
+                self.schema = loads(content, content_type)
+                if self.load_normalized():
+                    # Operations come validated and resolved from the cache
+                    self.schema = OpenAPISchemaV3.lazy(self.schema)
+                    return
+            else:
+                self.schema = load_file(path)
         elif schema:
             self.schema = schema
         elif request.target:
             self.host = request.target.split('/')[2:][0]
-            self.schema = requests.get(request.target).json()
+            self.schema = self.fetcher.load(request.target)
         else:
             raise ValueError(
-                "Either path to schema, URL to OpenAPI schema, or schema is a required field",
+                "Either path to schema, URL to OpenAPI schema, or schema"
+                " is a required field",
             )
+        include_paths = request.include_paths
+        include_tags = request.include_tags
         if isinstance(self.schema, OpenAPISchemaV3):
-            self.schema = self.schema.to_dict(no_empty=False)
-        # Validate schema
-        self.schema = OpenAPISchemaV3(**self.schema)
-        self.test_data = self.load_test_data(
-            request.test_data or [],
-            request.test_data_file,
-            request.test_config,
-        )
+            # Already validated, only go back to a dict to filter it
+            if include_paths or include_tags:
+                self.schema = self.schema.to_dict(no_empty=False)
+        if not isinstance(self.schema, OpenAPISchemaV3):
+            filtered = include_paths or include_tags
+            if filtered and isinstance(self.schema, dict):
+                self.schema = dict(self.schema, paths=self.filter_paths(
+                    self.schema.get('paths') or {},
+                    include_paths, include_tags,
+                ))
+            # Fetch remote documents while walking a dict is cheap
+            if isinstance(self.schema, dict):
+                with profile.stage('fetch'):
+                    self.fetcher.prefetch(self.remote_refs(self.schema))
+            # Validate schema
+            with profile.stage('validate'):
+                if request.lazy_validation:
+                    self.schema = OpenAPISchemaV3.lazy(self.schema)
+                else:
+                    self.schema = OpenAPISchemaV3.parse_obj(self.schema)
+        else:
+            with profile.stage('fetch'):
+                self.fetcher.prefetch(self.remote_refs(self.schema))
+
+    @classmethod
+    def filter_paths(
+        cls, paths: dict, include_paths: Optional[List[str]] = None,
+        include_tags: Optional[List[str]] = None,
+    ) -> dict:
+        """Keep operations whose path matches a glob and that have a tag."""
+        return filter_paths(paths, include_paths, include_tags)
+
+    @classmethod
+    def remote_refs(cls, schema) -> set:
+        """URLs of the documents referenced by a schema, dict or model.
+
+        Both remote $refs and components given as a URL.
+        """
+        if not isinstance(schema, dict):
+            schema = schema.__dict__
+        components = schema.get('components') or {}
+        urls = {
+            ref for ref in iter_refs([components, schema.get('paths')])
+            if ref.startswith('http')
+        }
+        for section in components.values():
+            for node in (section or {}).values():
+                if isinstance(node, str) and node.startswith('http'):
+                    urls.add(node)
+        return urls
 
     @classmethod
-    def load_remote_refs(cls, schema_path):
+    def load_remote_refs(cls, schema_path, fetcher: Optional[Fetcher] = None):
         if isinstance(schema_path, str) and schema_path.startswith('http'):
-            import requests
+            if fetcher is None:
+                # One-off lookup, don't leave its session open
+                with Fetcher(cache_dir=get_settings().http_cache) as fetcher:
+                    return cls.load_remote_refs(schema_path, fetcher=fetcher)
             ref_path = None
             if '#' in schema_path:
                 ref_path = schema_path.split('#')[-1]
             try:
-                logger.debug(f"Fetching remote reference: {schema_path}")
-                schema_path = blind_load(
-                    requests.get(schema_path).content.decode('utf-8'),
-                )
+                logger.debug(f"Loading remote reference: {schema_path}")
+                schema_path = fetcher.load(schema_path)
                 if ref_path:
-                    schema_path = cls.find_ref(f'#/{ref_path}', schema_path)
+                    schema_path = cls.find_ref(
+                        f'#/{ref_path}', schema_path, fetcher=fetcher,
+                    )
             except Exception as e:
                 logger.error(f"Exception: {type(e)}: {e}")
                 raise e
@@ -131,45 +422,67 @@ class OpenAPIToPostman:
     @classmethod
     def load_local_refs(cls, schema_path):
         if isinstance(schema_path, str) and os.path.exists(schema_path):
-            schema_path = load_file(schema_path)
+            schema_path = load_file_cached(schema_path)
         return schema_path
 
     @classmethod
-    @hashable_lru
-    def find_ref(cls, ref: str, schema_path):
-        ref_path = ref.split('/')[1:]
-        while ref_path:
-            seek = ref_path.pop(0).replace('~1', '/').replace('~0', '~')
-            if seek:
-                if isinstance(schema_path, list) and seek.isdigit():
-                    schema_path = schema_path[int(seek)]
-                else:
-                    schema_path = schema_path[seek]
-        schema_path = cls.load_remote_refs(schema_path)
+    def find_ref(
+        cls, ref: str, schema_path, ref_index=None,
+        fetcher: Optional[Fetcher] = None,
+    ):
+        """Resolve ref against schema_path or, if it contains ref, ref_index.
+
+        Nodes from ref_index and remote documents are shared, treat as
+        read-only.
+        """
+        if ref_index and ref in ref_index:
+            schema_path = ref_index[ref]
+        elif ref.startswith('http'):
+            schema_path = ref
+        else:
+            ref_path = ref.split('/')[1:]
+            while ref_path:
+                seek = unescape_json_pointer(ref_path.pop(0))
+                if seek:
+                    if isinstance(schema_path, list) and seek.isdigit():
+                        schema_path = schema_path[int(seek)]
+                    else:
+                        schema_path = schema_path[seek]
+        schema_path = cls.load_remote_refs(schema_path, fetcher=fetcher)
         schema_path = cls.load_local_refs(schema_path)
 
         return schema_path
 
     @classmethod
     def path_parts(cls, path: str) -> list:
-        url = []
-        for part in path.split('/')[1:]:
-            is_path_variable = re.match(r'^{(\w+)}$', part)  # noqa: W605
-            is_path_segment = RE_PATH_VARIABLE.findall(part)
-            # queries = RE_PATH_VARIABLE_SEGMENT.findall(part)
-            if is_path_variable:
-                part = f':{is_path_variable.group(1)}'
-            elif is_path_segment:
-                for group in is_path_segment:
-                    part = part.replace(f"{{{group}}}", f"{{{{{group}}}}}")
-            if '(' in part and ')' in part:
-                part = part.replace('(', '').replace(')', '')
-            url.append(part)
-        return url
+        return list(compile_path(path).parts)
 
     def get_default_expect(self):
         return self.default_expect
 
+    def id_seed(self, *parts):
+        """Seed for uuidgen, None (random ids) unless a seed is set."""
+        if self.seed is not None:
+            return [self.seed, *parts]
+
+    def component_closure(self, refs: Iterable[str]) -> dict:
+        """Components transitively referenced by refs, as a schema fragment."""
+        components = defaultdict(lambda: {})
+        seen = set()
+        pending = list(refs)
+        while pending:
+            parts = pending.pop().split('/')
+            if parts[:2] != ['#', 'components'] or len(parts) < 4:
+                continue
+            pointer = '/'.join(parts[:4])
+            if pointer in seen or pointer not in self.ref_index:
+                continue
+            seen.add(pointer)
+            section, name = (unescape_json_pointer(p) for p in parts[2:4])
+            components[section][name] = self.ref_index[pointer]
+            pending.extend(iter_refs(self.ref_index[pointer]))
+        return {'components': dict(components)}
+
     def test_config_to_postman_config(self, test_config) -> PostmanConfig:
         test_data = []
         expect = defaultdict(self.get_default_expect)
@@ -178,12 +491,16 @@ class OpenAPIToPostman:
         collection_global_variables = []
         collection_test_scripts = []
         collection_prerequest_scripts = []
+        reference_schema = None
+        referenced_components = set()
         for route, td_item in test_config.items():
             i = td_item
             if isinstance(i, dict):
                 i = TestConfig(**td_item)
             if isinstance(i.variables, str):
-                variables = load_file(i.variables)
+                variables = load_file_cached(
+                    i.variables, scope=self.cache_scope,
+                )
             else:
                 variables = i.variables
             if route.lower() == 'collection':
@@ -237,7 +554,7 @@ class OpenAPIToPostman:
             # Variable(id=variable, type='string', value='default'))
             for k, v in (variables or {}).items():
                 if is_local_file_path(v):
-                    v = load_file(v)
+                    v = load_file_cached(v, scope=self.cache_scope)
                 test_data.extend([
                     TestData(route=route, in_=in_, key=k, value=v)
                     for in_ in list(ParameterIn)
@@ -261,7 +578,8 @@ class OpenAPIToPostman:
                 ])
         for verb, path, operation in self.routes:
             route_str = f"{verb.upper()} {path}"
-            for code, response in operation.responses.items():
+            ir = self.normalize_operation(operation)
+            for code, response in ir.responses:
                 if code == 'default':
                     code = 500
                 appended_test_scripts = False
@@ -280,9 +598,22 @@ class OpenAPIToPostman:
                                 schema_.get('properties') or {},
                             )
                             if PostmanTest.schema_validation in enabled_tests:
-                                test_scripts[route_str].append(
-                                    js_test_validate_schema(route_str, mt_props, self.schema.to_dict())
-                                )
+                                if self.shared_schema_components:
+                                    referenced_components.update(
+                                        iter_refs(mt_props),
+                                    )
+                                    script = js_test_validate_schema_from_variable(  # noqa: E501
+                                        route_str, mt_props,
+                                        SCHEMA_COMPONENTS_VARIABLE,
+                                    )
+                                else:
+                                    if reference_schema is None:
+                                        reference_schema = \
+                                            self.schema.to_dict()
+                                    script = js_test_validate_schema(
+                                        route_str, mt_props, reference_schema,
+                                    )
+                                test_scripts[route_str].append(script)
                         if PostmanTest.code in enabled_tests:
                             test_scripts[route_str].append(
                                 js_test_code(route_str, code),
@@ -299,6 +630,13 @@ class OpenAPIToPostman:
                                 )
                             )
                         appended_test_scripts = True
+        if referenced_components:
+            collection_global_variables.append(Variable(
+                id=SCHEMA_COMPONENTS_VARIABLE, type='string',
+                value=json.dumps(
+                    self.component_closure(referenced_components),
+                ),
+            ))
         return PostmanConfig(
             expect, test_data, test_scripts,
             prerequest_scripts, collection_global_variables,
@@ -312,7 +650,17 @@ class OpenAPIToPostman:
         if not (test_data_file or test_config):
             return test_data
         if test_data_file:
-            test_config = load_file(test_data_file)
+            test_config = load_file_cached(
+                test_data_file, scope=self.cache_scope,
+            )
+        # Routes setting globals, which other shards of a collection miss
+        self.make_global_routes = [
+            route for route, config in test_config.items()
+            if (
+                config.get('make_global') if isinstance(config, dict)
+                else getattr(config, 'make_global', None)
+            )
+        ]
         postman_config = self.test_config_to_postman_config(test_config)
         self.test_scripts.update(postman_config.test_scripts)
         self.prerequest_scripts.update(postman_config.prerequest_scripts)
@@ -335,19 +683,7 @@ class OpenAPIToPostman:
 
     @classmethod
     def guess_resource(cls, path: str):
-        parts = cls.path_parts(path)
-        last_part = None
-        for i, part in enumerate(parts):
-            is_variable = RE_PATH_GLOBAL_VARIABLE.match(part)\
-                or part.startswith(':')
-            segments = RE_PATH_CONVERTED_VARIABLE_SEGMENT.findall(part)
-            for segment, var in segments:
-                part = part.replace(segment, '')
-            # If this segment is a variable, return the last one
-            if is_variable and len(parts) - i == 1:
-                return last_part
-            last_part = part
-        return last_part
+        return compile_path(path).resource
 
     def verbose_msg(self, *msg, delim=','):
         if self.verbose:
@@ -362,14 +698,27 @@ class OpenAPIToPostman:
         by_resource = defaultdict(lambda: {})
         output = []
         for route in routes:
-            verb, path, operation = route
-            by_resource[cls.guess_resource(path)][verb] = route
+            if isinstance(route, RouteRecord):
+                resource = route.resource
+            else:
+                resource = cls.guess_resource(route.path)
+            by_resource[resource][route.verb] = route
         for resource, routes_by_verb in by_resource.items():
             for verb in verb_ordering:
                 if routes_by_verb.get(verb):
                     output.append(routes_by_verb[verb])
         return output
 
+    def fake_value(self, schema: dict, rng: Optional[random.Random] = None):
+        return pick_one(
+            generate_from_schema(
+                schema, corpus=self.test_data_corpus, seed=self.seed,
+                scope=self.cache_scope,
+            ),
+            rng=rng,
+        )
+
+    @profile.timed('fake_data')
     def fake_data_from_route_schema(
         self, verb: str, path: str, operation: Operation,
     ) -> ParameterRequestData:
@@ -377,67 +726,142 @@ class OpenAPIToPostman:
             logger.debug(f"Skipping fake_data generation for {verb} {path}")
             return ParameterRequestData()
         d = defaultdict(lambda: {})
-        all_path_vars = RE_PATH_VARIABLE.findall(path)
-        parameters = self._resolve_object(operation.parameters)
-
-        if parameters:
-            for parameter in operation.parameters:
-                parameter = self._resolve_object(
-                    parameter,
-                    new_cls=oapi.Parameter,
-                )
+        rng = None
+        if self.seed is not None:
+            rng = random.Random(fingerprint([self.seed, verb, path]))
+        all_path_vars = compile_path(path).variables
+        ir = self.normalize_operation(operation)
+
+        if ir.parameters:
+            for parameter in ir.parameters:
                 in_ = parameter.in_.value
                 param_schema = parameter.schema_
                 if in_ == 'body':
                     properties = param_schema.properties or {}
                     if isinstance(properties, Reference):
-                        properties = properties.resolve_ref(self.schema)
-                    for param, param_schema in properties.items():
-                        d[in_][param] = pick_one(
-                            generate_from_schema(param_schema),
+                        properties = properties.resolve_ref(
+                            self.schema, ref_index=self.ref_index,
+                            fetcher=self.fetcher,
                         )
+                    for param, param_schema in properties.items():
+                        d[in_][param] = self.fake_value(param_schema, rng)
                 else:
-                    d[in_][parameter.name] = pick_one(
-                        generate_from_schema(param_schema.to_dict()),
+                    d[in_][parameter.name] = self.fake_value(
+                        param_schema.to_dict(), rng,
                     )
-        request_body = self._resolve_object(
-            operation.requestBody,
-            new_cls=oapi.RequestBody,
-        )
-        if request_body:
-            for mimetype, media_type in request_body.content.items():
+        for mimetype, properties in ir.request_body_properties:
+            for name, prop in properties:
+                d['requestBody'][name] = self.fake_value(prop, rng)
+        for path_var in sorted(
+            set(all_path_vars).difference(set(d.get('path', []))),
+        ):
+            logger.warning(
+                f"Path variable {path_var} isn't defined as a parameter "
+                f"generating test data for it assuming it's a string."
+            )
+            d['path'][path_var] = self.fake_value({'type': 'string'}, rng)
+        d = dict(d)
+        return ParameterRequestData(**d)
+
+    @property
+    def route_table(self) -> List[RouteRecord]:
+        """A RouteRecord for every operation, built once per schema."""
+        if self._route_table is None:
+            self._route_table = [
+                RouteRecord(verb, path, path_item.get_safe(verb))
+                for path, path_item in self.paths
+                for verb in HTTP_VERBS if path_item.get_safe(verb)
+            ]
+        return self._route_table
+
+    def normalize_operation(self, operation: Operation) -> OperationIR:
+        """Resolve everything a conversion reads from operation, once."""
+        ir = self.operations_ir.get(id(operation))
+        if ir is not None:
+            return ir
+        with profile.stage('normalize'):
+            parameters = tuple(
+                self._resolve_object(p, new_cls=oapi.Parameter)
+                for p in self._resolve_object(operation.parameters or [])
+            )
+            request_body = self._resolve_object(
+                operation.requestBody, new_cls=oapi.RequestBody,
+            )
+            request_body_properties = []
+            for mimetype, media_type in (
+                request_body.content.items() if request_body else []
+            ):
                 schema_ = self._resolve_object(media_type.schema_ or {})
                 mt_props = self._resolve_object(
                     schema_.get('properties') or {},
                 )
+                properties = []
                 for name, prop in mt_props.items():
                     prop = self._resolve_object(prop)
                     if not isinstance(prop, dict):
                         prop = prop.to_dict()
                     if prop.get('ref') or prop.get('$ref'):
                         logger.error(f"Unresolved reference in media type! {media_type}")  # noqa; E501
-                    d['requestBody'][name] = pick_one(
-                        generate_from_schema(prop),
-                    )
-        for path_var in set(all_path_vars).difference(set(d.get('path', []))):
-            logger.warning(
-                f"Path variable {path_var} isn't defined as a parameter "
-                f"generating test data for it assuming it's a string."
-            )
-            d['path'][path_var] = pick_one(
-                generate_from_schema({'type': 'string'}),
+                    properties.append((name, prop))
+                request_body_properties.append((mimetype, tuple(properties)))
+            responses = tuple(
+                (code, self._resolve_object(response, new_cls=oapi.Response))
+                for code, response in operation.responses.items()
             )
-        d = dict(d)
-        return ParameterRequestData(**d)
+        ir = OperationIR(
+            operation, parameters, request_body,
+            tuple(request_body_properties), responses,
+        )
+        self.operations_ir[id(operation)] = ir
+        return ir
+
+    @classmethod
+    def normalized_key(
+        cls, content: bytes, request: OpenAPISchemaToPostmanRequest,
+    ) -> str:
+        """Cache key of the normalized operations of a spec file."""
+        return fingerprint(json.dumps([
+            IR_CACHE_VERSION,
+            hashlib.sha256(content).hexdigest(),
+            request.include_paths, request.include_tags,
+        ]))
+
+    def load_normalized(self) -> bool:
+        """Load the route table and OperationIRs from the IR cache."""
+        cached = self.ir_cache.get(self.ir_cache_key)
+        if not cached:
+            return False
+        try:
+            with gc_paused():
+                table = [
+                    (verb, path, OperationIR.from_dict(ir))
+                    for verb, path, ir in loads_json(cached)
+                ]
+        except Exception as e:
+            logger.warning(f"Ignoring IR cache entry: {type(e).__name__}: {e}")
+            return False
+        logger.debug(f"Using cached IR {self.ir_cache_key}")
+        profile.count('ir_cache_hits')
+        self._route_table = []
+        for verb, path, ir in table:
+            self._route_table.append(RouteRecord(verb, path, ir.operation))
+            self.operations_ir[id(ir.operation)] = ir
+        return True
+
+    def save_normalized(self):
+        """Normalize every operation and save them to the IR cache.
+
+        Remote documents are part of the IR but not of its key, they're
+        read again once the spec itself changes.
+        """
+        self.ir_cache.set(self.ir_cache_key, json.dumps([
+            (verb, path, self.normalize_operation(operation).to_dict())
+            for verb, path, operation in self.route_table
+        ]).encode('utf-8'))
 
     @property
-    def routes(self) -> Generator[Route, None, None]:
-        for path, operation in self.paths:
-            for verb, operation in [
-                (verb, operation.get_safe(verb))
-                for verb in HTTP_VERBS if operation.get_safe(verb)
-            ]:
-                yield Route(verb, path, operation)
+    def routes(self) -> Generator[RouteRecord, None, None]:
+        yield from self.route_table
 
     @property
     def info(self):
@@ -449,8 +873,7 @@ class OpenAPIToPostman:
 
     def operation_param_examples(self, operation: Operation):
         examples = defaultdict(lambda: defaultdict(lambda: []))
-        for param in self._resolve_object(operation.parameters or []):
-            param = self._resolve_object(param, new_cls=oapi.Parameter)
+        for param in self.normalize_operation(operation).parameters:
             param_in = param.in_.value
             if param_in == 'body':
                 examples['body'] = []
@@ -463,15 +886,70 @@ class OpenAPIToPostman:
                 target.extend(param.examples)
         return examples
 
+    def resolve_reference(self, ref: str, deep=False):
+        """Resolve ref once and share the result with every later use.
+
+        The result is shared, treat it as read-only. A ref that is reached
+        again while it is being resolved is a cycle: it raises a ValueError
+        when strict, otherwise the inner occurrence is left as a $ref, and
+        results holding a $ref to a ref still being resolved aren't cached.
+        """
+        key = (ref, deep)
+        if key in self.resolved_refs:
+            profile.count('ref_cache_hits')
+            return self.resolved_refs[key]
+        if ref in self.ref_stack:
+            cycle = self.ref_stack[self.ref_stack.index(ref):] + [ref]
+            if self.strict:
+                raise ValueError(f"Circular reference {' -> '.join(cycle)}")
+            logger.warning(f"Circular reference {' -> '.join(cycle)}")
+            self.ref_cycle_floor = min(
+                self.ref_cycle_floor, self.ref_stack.index(ref),
+            )
+            return {'$ref': ref}
+        logger.debug(f"Resolving reference {ref}")
+        profile.count('refs_resolved')
+        depth, outer_floor = len(self.ref_stack), self.ref_cycle_floor
+        self.ref_cycle_floor = depth + 1
+        self.ref_stack.append(ref)
+        try:
+            o = Reference(**{'$ref': ref}).resolve_ref(
+                self.schema, ref_index=self.ref_index, fetcher=self.fetcher,
+            )
+            if 'to_dict' in dir(o):
+                o = o.to_dict()
+            if deep:
+                o = self._resolve_children(o)
+        finally:
+            self.ref_stack.pop()
+            inner_floor = self.ref_cycle_floor
+            self.ref_cycle_floor = min(outer_floor, inner_floor)
+        # A placeholder for a ref that's still open is only right from
+        # inside that ref, so don't reuse the result elsewhere
+        if inner_floor >= depth:
+            self.resolved_refs[key] = o
+        return o
+
+    def _resolve_children(self, o):
+        if isinstance(o, dict):
+            if o.get('$ref'):
+                return self.resolve_reference(o['$ref'], deep=True)
+            # Don't write resolved children into shared reference nodes
+            return {k: self._resolve_children(v) for k, v in o.items()}
+        if isinstance(o, list):
+            return [self._resolve_children(v) for v in o]
+        if isinstance(o, Reference):
+            return self.resolve_reference(o.ref, deep=True)
+        if 'to_dict' in dir(o):
+            return self._resolve_children(o.to_dict())
+        return o
+
     def _resolve_object(self, o, new_cls=None, deep=False):
         if isinstance(o, Reference):
-            logger.debug(f"Resolving reference {o.ref} Try #{self.ref_depth[o.ref]}")  # noqa; E501
-            if self.ref_depth[o.ref] > self.max_ref_depth:
-                if self.strict:
-                    raise ValueError(f"Max reference recursion reached for {o.ref}")  # noqa; E501
-                return
-            self.ref_depth[o.ref] += 1
-            o = o.resolve_ref(self.schema)
+            o = self.resolve_reference(o.ref, deep=deep)
+            if isinstance(o, dict) and new_cls:
+                o = new_cls(**o)
+            return o
         elif '$ref' in dir(o):
             if isinstance(o, SchemaObject):
                 logger.warning("SchemaObject should be a Reference object, catching serialization issue...")
@@ -495,142 +973,388 @@ class OpenAPIToPostman:
             )
         if 'to_dict' in dir(o):
             o = o.to_dict()
-        if deep and isinstance(o, dict):
-            for k, v in o.items():
-                if (isinstance(v, dict) and v.get('$ref')) or isinstance(v, Reference):
-                    if isinstance(v, Reference):
-                        v = v.to_dict()
-                    o[k] = self._resolve_object(Reference(**v), deep=True)
-                else:
-                    o[k] = self._resolve_object(v, deep=True)
+        if deep:
+            o = self._resolve_children(o)
         if isinstance(o, dict) and new_cls:
             o = new_cls(**o)
         return o
 
+    @profile.timed('parameters')
     def convert_parameters(self, verb, path, operation: Operation):
         return ParameterBuilder(
             self, verb, path, operation, self.test_data,
         ).build()
 
-    def _generate_postman_collections(self):
-        build_url = lambda path, vars=None, query=[]: Url(
+    @classmethod
+    def build_url(cls, path, vars=None, query=None):
+        return Url.trusted(
             host=["{{baseUrl}}"],
-            path=self.path_parts(path),
-            query=query,
+            path=cls.path_parts(path),
+            query=query or [],
             variable=vars or [],
         )
-        items = []
-        global_variables = self.collection_global_variables or []
-        ordered_routes = self.order_routes_by_resource(self.routes)
-        for verb, path, operation in ordered_routes:
-            responses = []
-            route_str = f"{verb.upper()} {path}"
-            for code, response in operation.responses.items():
-                if code == 'default':
-                    code = 500
-                if isinstance(code, str) and 'x' in code.lower():
-                    code = code.lower().replace('x', '0')
-                http_reason = get_http_reason(code)
-                response = self._resolve_object(
-                    response, new_cls=oapi.Response,
-                )
-                for mimetype, route_definition in (
-                    response.content or {'text/html': {}}
-                ).items():
-                    responses.append(Response(
-                        id=uuidgen(),
-                        name=response.description,
-                        originalRequest=OriginalRequest(
-                            url=build_url(path),
-                            method=verb.upper(),
-                            body={},
-                        ),
-                        code=int(code),
-                        status=http_reason,
-                        header=[
-                            Header(key='Content-Type', value=mimetype),
-                        ],
-                        cookie=[],
-                        body=response.description,
-                    ))
-            (
-                new_globals, query, request_url_variables,
-                request_header, request_body
-            ) = self.convert_parameters(verb, path, operation)
-            global_variables.extend(new_globals)
 
-            if global_variables:
-                self.verbose_msg(f'{verb} {path} global variables {global_variables}')
-            if query:
-                self.verbose_msg(f'{verb} {path} query param variables {query}')
-            if request_url_variables:
-                self.verbose_msg(f'{verb} {path} url variables {request_url_variables}')
-            if request_header:
-                self.verbose_msg(f'{verb} {path} headers {request_header}')
-            if request_body:
-                self.verbose_msg(f'{verb} {path} request_body {request_body}')
-            items.append(
-                Item(
-                    id=uuidgen(),
-                    name=operation.summary or route_str,
-                    request=Request(
-                        auth=Auth(type='noauth'),
-                        url=build_url(
-                            path, vars=request_url_variables, query=query,
-                        ),
+    @staticmethod
+    def external_refs(o) -> bool:
+        """Whether o refers to a remote or local file document."""
+        return any(not ref.startswith('#') for ref in iter_refs(o)) or any(
+            isinstance(node, str)
+            for section in (o.get('components') or {}).values()
+            for node in (section or {}).values()
+        )
+
+    def route_fingerprint(
+        self, verb, path, operation: Operation,
+    ) -> Optional[str]:
+        """Fingerprint everything the Item generated for a route depends on.
+
+        None for routes using documents outside the schema, their content
+        isn't part of the fingerprint.
+        """
+        route_str = f"{verb.upper()} {path}"
+        settings = self.settings
+        operation = operation.to_dict()
+        closure = self.component_closure(iter_refs(operation))
+        if self.external_refs(operation) or self.external_refs(closure):
+            return None
+        return fingerprint(json.dumps([
+            ITEM_CACHE_VERSION,
+            verb, path, operation,
+            closure,
+            [
+                t.to_dict() for t in self.test_data
+                if t.route.lower() == route_str.lower()
+            ],
+            [s.to_dict() for s in self.test_scripts.get(route_str, [])],
+            [s.to_dict() for s in self.prerequest_scripts.get(route_str, [])],
+            self.expect[route_str].to_dict(),
+            self.strict,
+            self.seed,
+            settings.test_data_str_min_length,
+            settings.test_data_int_min,
+        ], sort_keys=True, default=str))
+
+    def load_cached_item(self, key):
+        cached = self.item_cache.get(key)
+        if cached:
+            cached = json.loads(cached)
+            return (
+                [Variable(**v) for v in cached['globals']],
+                Item(**cached['item']),
+            )
+
+    def save_cached_item(self, key, new_globals, item):
+        self.item_cache.set(key, json.dumps({
+            'globals': [v.to_dict() for v in new_globals],
+            'item': item.to_dict(),
+        }).encode('utf-8'))
+
+    def route_items(self, routes: Iterable[Route]):
+        """Yield (new globals, Item) for each route, in order.
+
+        Items of unchanged routes are loaded from the item cache when
+        they're reached, the rest are built serially or across jobs
+        processes.
+        """
+        routes = list(routes)
+        keys, hits = {}, set()
+        if self.item_cache:
+            for i, (verb, path, operation) in enumerate(routes):
+                keys[i] = self.route_fingerprint(verb, path, operation)
+                if keys[i] and self.item_cache.has(keys[i]):
+                    hits.add(i)
+        built = self._build_items(
+            [route for i, route in enumerate(routes) if i not in hits],
+        )
+        for i, (verb, path, operation) in enumerate(routes):
+            hit = self.load_cached_item(keys[i]) if i in hits else None
+            if hit:
+                logger.debug(f"Using cached item for {verb} {path}")
+                profile.count('item_cache_hits')
+                yield hit
+                continue
+            if i in hits:
+                # Removed from the cache since it was found
+                new_globals, item = self._build_item(verb, path, operation)
+            else:
+                new_globals, item = next(built)
+            if keys.get(i):
+                self.save_cached_item(keys[i], new_globals, item)
+            yield new_globals, item
+
+    def _build_items(self, routes: List[Route]):
+        if (
+            not self.jobs or self.jobs < 2 or len(routes) < 2
+            or 'fork' not in multiprocessing.get_all_start_methods()
+        ):
+            for verb, path, operation in routes:
+                yield self._build_item(verb, path, operation)
+            return
+        # Forked workers inherit the initializer's arguments unpickled
+        with ProcessPoolExecutor(
+            max_workers=self.jobs,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_pool_init, initargs=(self, routes),
+        ) as executor:
+            for item, report in executor.map(
+                _pool_build_item, range(len(routes)),
+                chunksize=max(1, len(routes) // (self.jobs * 4)),
+            ):
+                profile.merge(report)
+                yield item
+
+    @profile.timed('item')
+    def _build_item(self, verb, path, operation: Operation):
+        profile.count('items_built')
+        responses = []
+        route_str = f"{verb.upper()} {path}"
+        for code, response in self.normalize_operation(operation).responses:
+            if code == 'default':
+                code = 500
+            if isinstance(code, str) and 'x' in code.lower():
+                code = code.lower().replace('x', '0')
+            http_reason = get_http_reason(code)
+            for mimetype, route_definition in (
+                response.content or {'text/html': {}}
+            ).items():
+                responses.append(Response.trusted(
+                    id=uuidgen(seed=self.id_seed(
+                        route_str, 'response', code, mimetype,
+                    )),
+                    name=response.description,
+                    originalRequest=OriginalRequest.trusted(
+                        url=self.build_url(path),
                         method=verb.upper(),
-                        name=operation.summary or route_str,
-                        description={},
-                        body=request_body,
-                        header=request_header,
+                        body={},
                     ),
-                    response=responses,
-                    event=[
-                        e for e in [
-                            new_event(
-                                'test',
-                                self.test_scripts.get(route_str, []),
-                            ),
-                            new_event(
-                                'prerequest',
-                                self.prerequest_scripts.get(route_str, []),
-                            ),
-                        ] if e
+                    code=int(code),
+                    status=http_reason,
+                    header=[
+                        Header.trusted(key='Content-Type', value=mimetype),
                     ],
-                )
-            )
-
-        return [
-            global_variables, items
-        ]
+                    cookie=[],
+                    body=response.description,
+                ))
+        (
+            new_globals, query, request_url_variables,
+            request_header, request_body
+        ) = self.convert_parameters(verb, path, operation)
 
-    def to_postman_collection_v2(self):
-        global_variables, items = self._generate_postman_collections()
-        return Collection(
+        if new_globals:
+            self.verbose_msg(f'{verb} {path} global variables {new_globals}')
+        if query:
+            self.verbose_msg(f'{verb} {path} query param variables {query}')
+        if request_url_variables:
+            self.verbose_msg(
+                f'{verb} {path} url variables {request_url_variables}',
+            )
+        if request_header:
+            self.verbose_msg(f'{verb} {path} headers {request_header}')
+        if request_body:
+            self.verbose_msg(f'{verb} {path} request_body {request_body}')
+        return new_globals, Item.trusted(
+            id=uuidgen(seed=self.id_seed(route_str, 'item')),
+            name=operation.summary or route_str,
+            request=Request.trusted(
+                auth=Auth.trusted(type='noauth'),
+                url=self.build_url(
+                    path, vars=request_url_variables, query=query,
+                ),
+                method=verb.upper(),
+                name=operation.summary or route_str,
+                description={},
+                body=request_body,
+                header=request_header,
+            ),
+            response=responses,
             event=[
                 e for e in [
-                    new_event('test', self.collection_test_scripts),
+                    new_event(
+                        'test',
+                        self.test_scripts.get(route_str, []),
+                        seed=self.id_seed(route_str, 'test'),
+                    ),
                     new_event(
                         'prerequest',
-                        self.collection_prerequest_scripts,
+                        self.prerequest_scripts.get(route_str, []),
+                        seed=self.id_seed(route_str, 'prerequest'),
                     ),
                 ] if e
             ],
-            variable=[
-                Variable(id='baseUrl', type='string', value=self.host or '/'),
-                *global_variables,
-            ],
+        )
+
+    def iter_route_items(self, global_variables: List[Variable]):
+        """Yield (Route, Item) in run order, extending global_variables."""
+        ordered_routes = self.order_routes_by_resource(self.routes)
+        built = self.route_items(ordered_routes)
+        for route, (new_globals, item) in zip(ordered_routes, built):
+            global_variables.extend(new_globals)
+            yield route, item
+
+    def iter_postman_items(self, global_variables: List[Variable]):
+        """Yield the collection's Items or Folders.
+
+        Extends global_variables as it goes.
+        """
+        route_items = self.iter_route_items(global_variables)
+        if self.folders:
+            groups = self.group_items(route_items, self.folders)
+            for name, items in groups.items():
+                yield self.folder(name, items)
+        else:
+            for _, item in route_items:
+                yield item
+
+    def folder_name(self, route: RouteRecord, folders: FolderBy) -> str:
+        if folders == FolderBy.tag and route.operation.tags:
+            return route.operation.tags[0]
+        return route.resource or '/'
+
+    def group_items(self, route_items, folders: FolderBy) -> dict:
+        """Map folder names, in order of appearance, to their Items."""
+        groups = defaultdict(lambda: [])
+        for route, item in route_items:
+            groups[self.folder_name(route, folders)].append(item)
+        return groups
+
+    def folder(self, name: str, items: List[Item]) -> Folder:
+        return Folder.trusted(
+            id=uuidgen(seed=self.id_seed('folder', name)),
+            name=name,
             item=items,
-            info=Info(
-                _postman_id=uuidgen(),
-                name=self.info.title,
-                schema='https://schema.getpostman.com/json/collection/v2.1.0/collection.json',  # noqa: E501
-                description=Description(
-                    content=self.info.get_safe('description')\
-                        or self.title_version,
-                    type='text/plain',
-                ),
+            event=[],
+        )
+
+    @classmethod
+    def balance(cls, sizes: List[int], n: int) -> List[List[int]]:
+        """Split indexes of sizes into at most n bins of similar total size.
+
+        Each bin keeps its indexes in their original order.
+        """
+        bins = [[] for _ in range(max(1, n))]
+        totals = [0] * len(bins)
+        for i in sorted(range(len(sizes)), key=lambda i: -sizes[i]):
+            smallest = totals.index(min(totals))
+            bins[smallest].append(i)
+            totals[smallest] += sizes[i]
+        return [sorted(b) for b in bins if b]
+
+    def postman_collection_shards(self) -> List[Collection]:
+        """Split the collection to run the parts on parallel newman processes.
+
+        shards is a number of collections balanced by item count, or
+        "folder" for one collection per folder. Items of a folder (of a
+        resource, without folders) stay together and in order.
+        """
+        if self.make_global_routes:
+            logger.warning(
+                "Shards run in parallel and don't share globals, tests "
+                "using the globals made by "
+                f"{', '.join(self.make_global_routes)} may fail",
             )
+        global_variables = self.collection_global_variables or []
+        groups = self.group_items(
+            self.iter_route_items(global_variables),
+            self.folders or FolderBy.resource,
+        )
+        names = list(groups)
+        if self.shards == 'folder':
+            bins = [[i] for i in range(len(names))]
+        else:
+            bins = self.balance(
+                [len(groups[name]) for name in names], int(self.shards),
+            )
+        # A schema without operations is still one, empty, collection
+        bins = bins or [[]]
+        collections = []
+        for shard, indexes in enumerate(bins):
+            items = []
+            for name in (names[i] for i in indexes):
+                if self.folders:
+                    items.append(self.folder(name, groups[name]))
+                else:
+                    items.extend(groups[name])
+            collections.append(Collection.trusted(
+                event=self.collection_events(),
+                variable=self.collection_variables(global_variables),
+                item=items,
+                info=self.collection_info(shard=(shard, len(bins))),
+            ).validate_output())
+        return collections
+
+    def write_postman_collection_shards(self, path: str) -> List[str]:
+        """Write each shard next to path, returning the shard paths."""
+        root, ext = os.path.splitext(path)
+        paths = []
+        for i, collection in enumerate(self.postman_collection_shards()):
+            paths.append(f'{root}.{i}{ext or ".json"}')
+            collection.to_file(paths[-1])
+        return paths
+
+    def _generate_postman_collections(self):
+        global_variables = self.collection_global_variables or []
+        items = list(self.iter_postman_items(global_variables))
+        return [
+            global_variables, items
+        ]
+
+    def collection_events(self):
+        return [
+            e for e in [
+                new_event(
+                    'test', self.collection_test_scripts,
+                    seed=self.id_seed('collection', 'test'),
+                ),
+                new_event(
+                    'prerequest',
+                    self.collection_prerequest_scripts,
+                    seed=self.id_seed('collection', 'prerequest'),
+                ),
+            ] if e
+        ]
+
+    def collection_variables(self, global_variables: List[Variable]):
+        return [
+            Variable.trusted(
+                id='baseUrl', type='string', value=self.host or '/',
+            ),
+            *global_variables,
+        ]
+
+    def collection_info(self, shard: Optional[Tuple[int, int]] = None):
+        name = self.info.title
+        if shard:
+            name = f'{name} ({shard[0] + 1}/{shard[1]})'
+        return Info(
+            _postman_id=uuidgen(seed=self.id_seed('collection', *shard or [])),
+            name=name,
+            schema='https://schema.getpostman.com/json/collection/v2.1.0/collection.json',  # noqa: E501
+            description=Description(
+                content=(
+                    self.info.get_safe('description') or self.title_version
+                ),
+                type='text/plain',
+            ),
+        )
+
+    def to_postman_collection_v2(self):
+        global_variables, items = self._generate_postman_collections()
+        with profile.stage('collection'):
+            return Collection.trusted(
+                event=self.collection_events(),
+                variable=self.collection_variables(global_variables),
+                item=items,
+                info=self.collection_info(),
+            ).validate_output()
+
+    def write_postman_collection_v2(self, f):
+        """Write the collection to f as each Item is generated."""
+        global_variables = self.collection_global_variables or []
+        write_collection(
+            f, self.iter_postman_items(global_variables),
+            event=self.collection_events(),
+            variable=lambda: self.collection_variables(global_variables),
+            info=self.collection_info(),
         )
 
 
@@ -639,7 +1363,8 @@ class ParameterBuilder:
         self.mormo, self.verb, self.path, self.operation, self.test_data = (
             mormo, verb, path, operation, test_data,
         )
-        self.params = mormo._resolve_object(operation.parameters or [])
+        self.ir = mormo.normalize_operation(operation)
+        self.params = self.ir.parameters
         self.config_test_data = list_of_test_data_to_params(
             f"{verb} {path}",
             self.test_data,
@@ -650,7 +1375,9 @@ class ParameterBuilder:
         self.examples = flatten_iterables_in_dict(
             mormo.operation_param_examples(operation),
         )
-        self.path_vars = [p[1:] for p in mormo.path_parts(path) if p.startswith(':')]
+        compiled = compile_path(path)
+        self.path_vars = list(compiled.path_vars)
+        self.segment_vars = compiled.segment_vars
 
     def get_mapped_value(self, v):
         return ChainMap(
@@ -661,22 +1388,20 @@ class ParameterBuilder:
 
     @classmethod
     def build_test_data_from_param(self, param, mapped_value):
-        return Parameter(
+        return Parameter.trusted(
             key=param.name,
             value=str(mapped_value[param.name]),
         )
 
     def get_path_param_variables(self, url, param):
         global_ = []
-        segment_vars = set(RE_PATH_VARIABLE.findall(self.path))\
-            .difference(self.path_vars)
         found_var_location = False
         mapped_value = self.get_mapped_value('path')
-        for v in segment_vars:
+        for v in self.segment_vars:
             if v == param.name:
                 if v in mapped_value:
                     global_.append(
-                        Variable(
+                        Variable.trusted(
                             id=v, type='string',
                             value=str(mapped_value[v])
                         )
@@ -699,7 +1424,7 @@ class ParameterBuilder:
                 first_var = not_processed_path_vars.pop()
                 if first_var in mapped_value:
                     url.append(
-                        Parameter(
+                        Parameter.trusted(
                             key=first_var,
                             value=str(mapped_value[first_var]),
                         )
@@ -713,7 +1438,7 @@ class ParameterBuilder:
                             " param is mapped to a value so using that value with the guessed name."  # noqa; E501
                         )
                         url.append(
-                            Parameter(
+                            Parameter.trusted(
                                 key=self.path_vars[0],
                                 value=str(mapped_value[param.name]),
                             )
@@ -736,11 +1461,11 @@ class ParameterBuilder:
             },
         )
 
-        for path_var in missing_variable:
+        for path_var in sorted(missing_variable):
             mapped_value = self.get_mapped_value('path')
             if mapped_value.get(path_var):
                 url.append(
-                    Parameter(
+                    Parameter.trusted(
                         key=path_var,
                         value=str(mapped_value[path_var]),
                     )
@@ -753,7 +1478,6 @@ class ParameterBuilder:
         header = []
         body_args = {}
         for param in self.params:
-            param = self.mormo._resolve_object(param, new_cls=oapi.Parameter)
             if param.in_.value != "body":
                 continue
             mapped_value = self.get_mapped_value('body')
@@ -762,30 +1486,27 @@ class ParameterBuilder:
                     f"Missing content for body parameter: {param.name}",
                 )
                 continue
-            body_args['mode'] = 'raw'
+            body_args['mode'] = Mode.raw
             body_args['raw'] = json.dumps(dict(mapped_value))
             header.append(
-                Parameter(
+                Parameter.trusted(
                     key='Content-Type',
                     value='application/json',
                 ),
             )
 
-        request_body = self.mormo._resolve_object(
-            self.operation.requestBody,
-            new_cls=oapi.RequestBody,
-        )
+        request_body = self.ir.request_body
 
         if (
-            request_body and not body_args.get('mode') == 'raw'
+            request_body and not body_args.get('mode') == Mode.raw
             and self.config_test_data.get('requestBody')
         ):
-            body_args['mode'] = 'raw'
+            body_args['mode'] = Mode.raw
             body_args['raw'] = json.dumps(
                 self.config_test_data.get('requestBody'),
             )
         if body_args:
-            return header, RequestBody(
+            return header, RequestBody.trusted(
                 **body_args,
             )
         return header, None
@@ -793,14 +1514,13 @@ class ParameterBuilder:
     def build(self) -> PostmanVariables:
         global_, query, url, header, body = ([], [], [], [], [])
         for param in self.params:
-            param = self.mormo._resolve_object(param, new_cls=oapi.Parameter)
             if not param.required:
                 continue
             param_in = param.in_.value
             mapped_value = self.get_mapped_value(param_in)
             if param_in == 'body':
                 continue
-            test_data = Parameter(
+            test_data = Parameter.trusted(
                 key=param.name,
                 value=str(mapped_value[param.name]),
             )
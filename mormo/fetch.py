@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import threading
+from typing import Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import logger
+from .cache import FileStore
+from .codec import loads
+
+
+def document_url(url: str) -> str:
+    """url without its fragment, the part a server is asked for."""
+    return url.split('#')[0]
+
+
+class Fetcher:
+    """GET documents over a pooled session, once per Fetcher.
+
+    With cache_dir, responses carrying an ETag or Last-Modified header are
+    kept on disk and later runs revalidate them with a conditional request
+    instead of downloading them again.
+    """
+
+    def __init__(
+        self, cache_dir: Optional[str] = None, jobs: int = 8,
+        timeout: float = 30,
+    ):
+        self.jobs = jobs
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=jobs, pool_maxsize=jobs)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.store = FileStore(cache_dir) if cache_dir else None
+        # url -> content and parsed document of what was fetched
+        self.contents = {}
+        self.documents = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def close(self):
+        """Close the session's pooled connections."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self.lock:
+            return self.locks.setdefault(url, threading.Lock())
+
+    def _cached(self, key: str) -> Optional[dict]:
+        meta = self.store.get(f'{key}.json') if self.store else None
+        content = self.store.get(key) if meta else None
+        if content is not None:
+            return dict(json.loads(meta), content=content)
+
+    def _download(self, url: str) -> bytes:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        cached = self._cached(key)
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+        logger.debug(f"Fetching {url}")
+        r = self.session.get(url, headers=headers, timeout=self.timeout)
+        if r.status_code == 304 and cached:
+            logger.debug(f"Not modified: {url}")
+            return cached['content']
+        r.raise_for_status()
+        meta = {
+            'etag': r.headers.get('ETag'),
+            'last_modified': r.headers.get('Last-Modified'),
+        }
+        if self.store and (meta['etag'] or meta['last_modified']):
+            # Content first, metadata marks the entry as complete
+            self.store.set(key, r.content)
+            self.store.set(f'{key}.json', json.dumps(meta).encode('utf-8'))
+        return r.content
+
+    def get(self, url: str) -> bytes:
+        url = document_url(url)
+        if url not in self.contents:
+            with self._url_lock(url):
+                if url not in self.contents:
+                    self.contents[url] = self._download(url)
+        return self.contents[url]
+
+    def load(self, url: str):
+        """The parsed JSON or YAML document at url.
+
+        It's shared, treat it as read-only.
+        """
+        url = document_url(url)
+        if url not in self.documents:
+            content = self.get(url)
+            with self._url_lock(url):
+                if url not in self.documents:
+                    self.documents[url] = loads(content)
+        return self.documents[url]
+
+    def prefetch(self, urls: Iterable[str]):
+        """Fetch and parse the documents of urls concurrently.
+
+        Failures are only logged, they're raised again where the document
+        is used.
+        """
+        urls = sorted(
+            {document_url(url) for url in urls} - set(self.documents),
+        )
+        if not urls:
+            return
+
+        def load(url):
+            try:
+                self.load(url)
+            except Exception as e:
+                logger.warning(
+                    f"Prefetching {url} failed: {type(e).__name__}: {e}",
+                )
+
+        with ThreadPoolExecutor(max_workers=min(self.jobs, len(urls))) as pool:
+            list(pool.map(load, urls))
@@ -0,0 +1,190 @@
+from collections import defaultdict
+from contextlib import contextmanager
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+)
+SIZE_BUCKETS = tuple(4 ** i * 256 for i in range(10))
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ''
+    labels = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in zip(names, values)
+    )
+    return f'{{{labels}}}'
+
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values = defaultdict(float)
+
+    def inc(self, *labels, n: float = 1):
+        with self.lock:
+            self.values[labels] += n
+
+    def render(self) -> List[str]:
+        with self.lock:
+            values = list(self.values.items())
+        return self.header() + [
+            f'{self.name}{format_labels(self.labels, labels)} {value}'
+            for labels, value in values
+        ]
+
+
+class Gauge(Metric):
+    """Gauge whose labelled values are read from a callback when scraped."""
+    type = 'gauge'
+
+    def __init__(self, name, documentation, callback: Callable, labels=()):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f'{self.name}{format_labels(self.labels, labels)} {value}'
+            for labels, value in self.callback()
+        ]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, *args, buckets: Iterable[float] = DEFAULT_BUCKETS,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., count, sum]
+        self.values = {}
+
+    def observe(self, *labels, value: float):
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(*labels, value=time.perf_counter() - start)
+
+    def render(self) -> List[str]:
+        with self.lock:
+            values = [(k, list(v)) for k, v in self.values.items()]
+        lines = self.header()
+        names = self.labels + ('le',)
+        for labels, counts in values:
+            bounds = self.buckets + ('+Inf',)
+            # The +Inf bucket is the count
+            for bound, n in zip(bounds, counts[:-1]):
+                bucket_labels = format_labels(names, labels + (bound,))
+                lines.append(f'{self.name}_bucket{bucket_labels} {n}')
+            labelled = format_labels(self.labels, labels)
+            lines.append(f'{self.name}_count{labelled} {counts[-2]}')
+            lines.append(f'{self.name}_sum{labelled} {counts[-1]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'mormo_http_request_duration_seconds', 'API request latency.',
+    labels=('method', 'route', 'status'),
+))
+STAGE_DURATION = REGISTRY.register(Histogram(
+    'mormo_conversion_stage_seconds',
+    'Time spent in each stage of a conversion.',
+    labels=('stage',),
+))
+CONVERSION_EVENTS = REGISTRY.register(Counter(
+    'mormo_conversion_events_total',
+    'Conversion counters, e.g. refs_resolved or strategy_cache_hits.',
+    labels=('event',),
+))
+REDIS_DURATION = REGISTRY.register(Histogram(
+    'mormo_redis_operation_duration_seconds', 'Redis round trip time.',
+    labels=('operation',),
+))
+DB_OBJECT_SIZE = REGISTRY.register(Histogram(
+    'mormo_db_object_bytes', 'Size of the objects saved to Redis.',
+    labels=('class',), buckets=SIZE_BUCKETS,
+))
+NEWMAN_RUNS = REGISTRY.register(Counter(
+    'mormo_newman_runs_total', 'newman runs by exit code.',
+    labels=('code',),
+))
+NEWMAN_DURATION = REGISTRY.register(Histogram(
+    'mormo_newman_duration_seconds', 'Duration of newman runs.',
+    buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+))
+
+
+def observe_profile(report: dict):
+    """Record the stages and counters of a Profiler report."""
+    for name, stage in report['stages'].items():
+        STAGE_DURATION.observe(name, value=stage['seconds'])
+    for name, n in report['counters'].items():
+        CONVERSION_EVENTS.inc(name, n=n)
+
+
+def _cache_stats():
+    from .cache import cache_stats
+    return [
+        ((name, k), v)
+        for name, stats in cache_stats().items()
+        for k, v in stats.items()
+    ]
+
+
+REGISTRY.register(Gauge(
+    'mormo_cache', 'Statistics of the in-memory caches.',
+    _cache_stats, labels=('cache', 'stat'),
+))
@@ -2,7 +2,7 @@ import json
 
 from pydantic import BaseModel as PyDanticBaseModel
 
-from .util import DB, strip_nulls
+from .util import DB, to_jsonable
 from . import redis_handle
 
 
@@ -16,18 +16,32 @@ class BaseModel(PyDanticBaseModel):
         dbo.save()
         return dbo
 
+    @classmethod
+    def trusted(cls, **values):
+        """Build from data mormo generated itself, skipping validation.
+
+        Nothing is checked here. Generated collections are validated later
+        by Collection.validate_output when Settings().validate_output.
+        """
+        return cls.construct(**values)
+
+    def validated(self):
+        """A validated copy, raises a ValidationError if a field is invalid."""
+        return self.parse_obj(self.to_dict(no_empty=False))
+
     def to_dict(self, no_empty=True):
         """Fixes serialization of dict()"""
-        d = json.loads(self.json(by_alias=True))
-        if no_empty:
-            d = strip_nulls(d)
-        return d
+        return to_jsonable(self, no_empty=no_empty)
 
-    def resolve_ref(self, schema):
+    def resolve_ref(self, schema, ref_index=None, fetcher=None):
         from .convert import OpenAPIToPostman
-        if issubclass(schema.__class__, BaseModel):
+        indexed = ref_index and self.ref in ref_index
+        remote = self.ref.startswith('http')
+        if not (indexed or remote) and issubclass(schema.__class__, BaseModel):
             schema = schema.to_dict()
-        return OpenAPIToPostman.find_ref(self.ref, schema)
+        return OpenAPIToPostman.find_ref(
+            self.ref, schema, ref_index=ref_index, fetcher=fetcher,
+        )
 
     def get_safe(self, v):
         try:
@@ -1,9 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
 import json
 
 from shlex import quote
 import subprocess
 import tempfile
 
+from . import metrics
 from .schema import NewmanResult
 from .schema.postman_collection_v2 import (
     Event, Script,
@@ -26,11 +28,13 @@ def run_newman(collection_file, host=None, verbose=None, json=False):
         json_outfile = temp.name
         cmdargs.extend(["--reporter-json-export", json_outfile])
     run_newman_args = ['newman', 'run', quote(collection_file), *cmdargs]
-    e = subprocess.run(
-        args=run_newman_args,
-        stderr=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-    )
+    with metrics.NEWMAN_DURATION.time():
+        e = subprocess.run(
+            args=run_newman_args,
+            stderr=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+    metrics.NEWMAN_RUNS.inc(e.returncode)
     print('EXEC', *run_newman_args)
     print('STDOUT', e.stdout.decode('utf-8'))
     print('STDERR', e.stderr.decode('utf-8'))
@@ -45,7 +49,25 @@ def run_newman(collection_file, host=None, verbose=None, json=False):
     )
 
 
-def new_event(listen, script):
+def run_newman_shards(collection_files, host=None, verbose=None, jobs=None):
+    """Run collections on parallel newman processes, merging the results."""
+    if not collection_files:
+        return NewmanResult(stdout='', code=0)
+    if len(collection_files) == 1:
+        return run_newman(collection_files[0], host=host, verbose=verbose)
+    with ThreadPoolExecutor(max_workers=jobs or len(collection_files)) as e:
+        results = list(e.map(
+            lambda f: run_newman(f, host=host, verbose=verbose),
+            collection_files,
+        ))
+    return NewmanResult(
+        stderr='\n'.join(r.stderr or '' for r in results),
+        stdout='\n'.join(r.stdout for r in results),
+        code=next((r.code for r in results if r.code), 0),
+    )
+
+
+def new_event(listen, script, seed=None):
     if isinstance(script, list):
         if not script:
             return
@@ -53,7 +75,9 @@ def new_event(listen, script):
         for i in script[1:]:
             _script += i
         script = _script
-    return Event(id=uuidgen(), listen=listen, script=script, disabled=False)
+    return Event(
+        id=uuidgen(seed=seed), listen=listen, script=script, disabled=False,
+    )
 
 
 def javascript(name, cmd):
@@ -109,3 +133,16 @@ def js_test_validate_schema(route, schema, reference_schema):
             }});
         """.format(schema=json.dumps(schema), reference_schema=json.dumps(reference_schema))
     )
+
+
+def js_test_validate_schema_from_variable(route, schema, variable):
+    return javascript(
+        name=f"{route} responds according to schema",
+        cmd="""
+            pm.test('Schema is valid', function() {{
+                var schema = {schema};
+                tv4.addSchema(JSON.parse(pm.variables.get("{variable}")));
+                pm.expect(tv4.validate(pm.response.json(), schema)).to.be.true;
+            }});
+        """.format(schema=json.dumps(schema), variable=variable)
+    )
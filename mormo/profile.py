@@ -0,0 +1,131 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+import contextvars
+import cProfile
+import functools
+import time
+from typing import Optional
+
+# The Profiler of the conversion running in this context, if any
+CURRENT = contextvars.ContextVar('mormo_profiler', default=None)
+
+
+class Profiler:
+    """Time spent in named stages of a conversion and event counters.
+
+    Stage times are inclusive, a stage running inside another is counted
+    in both.
+    """
+
+    def __init__(self, cprofile: bool = False):
+        self.seconds = defaultdict(float)
+        self.calls = Counter()
+        self.counters = Counter()
+        self.cprofile = cProfile.Profile() if cprofile else None
+
+    def merge(self, report: dict):
+        """Add a report, e.g. from a worker process, to this profile."""
+        for name, stage in report['stages'].items():
+            self.seconds[name] += stage['seconds']
+            self.calls[name] += stage['calls']
+        self.counters.update(report['counters'])
+
+    def report(self) -> dict:
+        return {
+            'stages': {
+                name: {'seconds': seconds, 'calls': self.calls[name]}
+                for name, seconds in self.seconds.items()
+            },
+            'counters': dict(self.counters),
+        }
+
+    def server_timing(self) -> str:
+        """The stages as a Server-Timing header value."""
+        return ', '.join(
+            f'{name};dur={seconds * 1000:.1f}'
+            for name, seconds in self.seconds.items()
+        )
+
+    def format(self) -> str:
+        lines = [
+            f'{name:<20}{seconds:>10.3f}s {self.calls[name]:>8} calls'
+            for name, seconds in sorted(
+                self.seconds.items(), key=lambda i: -i[1],
+            )
+        ]
+        lines.extend(
+            f'{name:<20}{n:>10}' for name, n in sorted(self.counters.items())
+        )
+        return '\n'.join(lines)
+
+    def dump_stats(self, path: str):
+        self.cprofile.dump_stats(path)
+
+
+@contextmanager
+def profiling(profiler: Optional[Profiler] = None):
+    """Collect stages and counters of the code run inside into profiler."""
+    profiler = profiler or Profiler()
+    token = CURRENT.set(profiler)
+    if profiler.cprofile:
+        profiler.cprofile.enable()
+    try:
+        with stage('total'):
+            yield profiler
+    finally:
+        if profiler.cprofile:
+            profiler.cprofile.disable()
+        CURRENT.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    profiler = CURRENT.get()
+    if profiler is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.seconds[name] += time.perf_counter() - start
+        profiler.calls[name] += 1
+
+
+def timed(name: str):
+    """Decorate a function to run each call as a stage."""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, n: int = 1):
+    profiler = CURRENT.get()
+    if profiler is not None:
+        profiler.counters[name] += n
+
+
+def merge(report: Optional[dict]):
+    profiler = CURRENT.get()
+    if profiler is not None and report:
+        profiler.merge(report)
+
+
+def profiled_call(f, *args):
+    """Call f, returning (result, report of a profile of just this call).
+
+    The report is None when not profiling. Used in worker processes, the
+    parent merges the reports into its profile.
+    """
+    if CURRENT.get() is None:
+        return f(*args), None
+    profiler = Profiler()
+    token = CURRENT.set(profiler)
+    try:
+        return f(*args), profiler.report()
+    finally:
+        CURRENT.reset(token)
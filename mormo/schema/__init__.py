@@ -20,6 +20,11 @@ class PostmanTest(enum.Enum):
     response_time = 'response_time'
 
 
+class FolderBy(enum.Enum):
+    tag = 'tag'
+    resource = 'resource'
+
+
 class Expect(BaseModel):
     code: Optional[Union[int, str]]
     enabled: bool = True
@@ -104,6 +109,19 @@ class OpenAPISchemaToPostmanRequest(BaseModel):
     collection_global_variables: Optional[List[postman_collection_v2.Variable]] = None  # noqa: E501
     expect: Optional[Dict[str, Expect]] = None
     verbose: Optional[bool] = False
+    shared_schema_components: Optional[bool] = False
+    item_cache: Optional[str] = None  # Directory or "redis"
+    http_cache: Optional[str] = None  # Directory
+    ir_cache: Optional[str] = None  # Directory or "redis"
+    jobs: Optional[int] = None
+    test_data_corpus: Optional[str] = None  # Directory or "redis"
+    seed: Optional[int] = None
+    lazy_validation: Optional[bool] = False
+    include_paths: Optional[List[str]] = None  # Glob patterns, e.g. /pets/*
+    include_tags: Optional[List[str]] = None
+    streaming: Optional[bool] = False  # Incrementally parse JSON specs
+    folders: Optional[FolderBy] = None
+    shards: Optional[Union[int, str]] = None  # N collections or "folder"
 
     class Config:
         fields = {'schema_': 'schema'}
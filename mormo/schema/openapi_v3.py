@@ -244,6 +244,26 @@ class Path(BaseModel):
     # parameters: Optional[List[Union[Parameter, Reference]]]
 
 
+class LazyPaths(dict):
+    """Paths that are validated as Path objects on first access."""
+
+    def __getitem__(self, key) -> Path:
+        value = super().__getitem__(key)
+        if not isinstance(value, Path):
+            value = Path(**value)
+            super().__setitem__(key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def items(self):
+        return ((k, self[k]) for k in self)
+
+    def values(self):
+        return (self[k] for k in self)
+
+
 class OpenAPISchemaV3(BaseModel):
     openapi: str
     paths: Dict[str, Path]
@@ -252,3 +272,13 @@ class OpenAPISchemaV3(BaseModel):
     components: Optional[dict]
     security: Optional[List[Dict[str, List]]]
     externalDocs: Optional[ExternalDocs]
+
+    @classmethod
+    def lazy(cls, data: dict) -> 'OpenAPISchemaV3':
+        """Validate all but paths, which are validated as they're used."""
+        if not isinstance(data, dict)\
+                or not isinstance(data.get('paths'), dict):
+            return cls.parse_obj(data)
+        schema = cls(**{**data, 'paths': {}})
+        schema.paths = LazyPaths(data['paths'])
+        return schema
@@ -1,8 +1,10 @@
 import enum
+import json
 import tempfile
 from typing import List, Optional, Union, Sequence
 
 from ..model import BaseModel
+from .. import profile, Settings
 
 VERSION = "2.1.0"
 
@@ -146,12 +148,57 @@ class Info(BaseModel):
         fields = {'postman_id': '_postman_id', 'schema_': 'schema'}
 
 
+def write_collection(f, items, info, event=None, variable=None):
+    """Write a collection to f serializing one item at a time.
+
+    variable may be a callable, it's called once every item is written.
+    """
+    validate = Settings().validate_output
+    f.write('{"item": [')
+    for i, item in enumerate(items):
+        if i:
+            f.write(', ')
+        if validate:
+            item.validated()
+        with profile.stage('serialize'):
+            json.dump(item.to_dict(), f)
+    f.write(']')
+    if callable(variable):
+        variable = variable()
+    if validate:
+        for v in variable or []:
+            if not isinstance(v, dict):
+                v.validated()
+    for k, v in (('event', event), ('variable', variable)):
+        if v is not None:
+            f.write(f', "{k}": ')
+            json.dump(
+                [i if isinstance(i, dict) else i.to_dict() for i in v], f,
+            )
+    f.write(', "info": ')
+    json.dump(info.to_dict(), f)
+    f.write('}')
+
+
 class Collection(BaseModel):
     item: Sequence[Union[Item, Folder]]
     event: Optional[list]
     variable: Optional[Sequence[Variable]]
     info: Info
 
+    def validate_output(self):
+        """Validate a trusted Collection when Settings().validate_output."""
+        if Settings().validate_output:
+            self.validated()
+        return self
+
+    def to_file(self, path):
+        with open(path, 'w') as f:
+            write_collection(
+                f, self.item, self.info,
+                event=self.event, variable=self.variable,
+            )
+
     def run(self, **kwargs):
         from ..postman_test import run_newman
         t = tempfile.NamedTemporaryFile()
@@ -0,0 +1,183 @@
+from fnmatch import fnmatch
+from typing import List, Optional
+
+from . import logger
+from .codec import load_file
+from .util import HTTP_VERBS, iter_refs, unescape_json_pointer
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Top level keys of a spec kept when it's reduced
+TOP_LEVEL_KEYS = ['openapi', 'info', 'servers', 'security', 'externalDocs']
+
+
+def include_path(path: str, include_paths: Optional[List[str]] = None):
+    return not include_paths or any(
+        fnmatch(path, pattern) for pattern in include_paths
+    )
+
+
+def include_operations(path_item: dict, include_tags: Optional[List[str]]):
+    """Drop the operations of path_item without one of include_tags.
+
+    Returns None when no operation is left.
+    """
+    if not include_tags:
+        return path_item
+    path_item = {
+        k: v for k, v in path_item.items()
+        if k.lower() not in HTTP_VERBS
+        or set((v or {}).get('tags') or []) & set(include_tags)
+    }
+    if any(k.lower() in HTTP_VERBS for k in path_item):
+        return path_item
+
+
+def filter_paths(
+    paths: dict, include_paths: Optional[List[str]] = None,
+    include_tags: Optional[List[str]] = None,
+) -> dict:
+    """Keep operations whose path matches a glob and that have a tag."""
+    filtered = {}
+    for path, path_item in paths.items():
+        if include_path(path, include_paths):
+            path_item = include_operations(path_item, include_tags)
+            if path_item is not None:
+                filtered[path] = path_item
+    return filtered
+
+
+def component_key(ref: str):
+    """('schemas', 'Pet') for '#/components/schemas/Pet/...', else None."""
+    parts = ref.split('/')
+    if len(parts) >= 4 and parts[:2] == ['#', 'components']:
+        return unescape_json_pointer(parts[2]), unescape_json_pointer(parts[3])
+
+
+def component_keys(o) -> set:
+    return {k for k in map(component_key, iter_refs(o)) if k}
+
+
+def nest_components(components: dict) -> dict:
+    nested = {}
+    for (section, name), node in components.items():
+        nested.setdefault(section, {})[name] = node
+    return nested
+
+
+def reduce_spec(
+    spec: dict, include_paths: Optional[List[str]] = None,
+    include_tags: Optional[List[str]] = None,
+) -> dict:
+    """The selected paths of spec and the components they reference."""
+    reduced = {k: spec[k] for k in TOP_LEVEL_KEYS if k in spec}
+    reduced['paths'] = filter_paths(
+        spec.get('paths') or {}, include_paths, include_tags,
+    )
+    components = spec.get('components') or {}
+    found = {}
+    stack = list(component_keys(reduced['paths']))
+    while stack:
+        key = stack.pop()
+        node = (components.get(key[0]) or {}).get(key[1])
+        if key in found or node is None:
+            continue
+        found[key] = node
+        stack.extend(component_keys(node))
+    reduced['components'] = nest_components(found)
+    return reduced
+
+
+def iter_nodes(f, select):
+    """Build and yield (key path, node) of the nodes of f accepted by select.
+
+    select is called with the key path (object keys, None for array items)
+    of each node outside of a selected one. Only selected nodes are built.
+    """
+    keys = []
+    builder, depth = None, 0
+    for event, value in ijson.basic_parse(f, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+                if not depth:
+                    yield tuple(keys), builder.value
+                    builder = None
+        elif event == 'map_key':
+            keys[-1] = value
+        elif event in ('end_map', 'end_array'):
+            keys.pop()
+        elif select(tuple(keys)):
+            if event in ('start_map', 'start_array'):
+                builder, depth = ijson.ObjectBuilder(), 1
+                builder.event(event, value)
+            else:
+                yield tuple(keys), value
+        elif event in ('start_map', 'start_array'):
+            keys.append(None)
+
+
+def load_spec_subset(
+    path: str, include_paths: Optional[List[str]] = None,
+    include_tags: Optional[List[str]] = None,
+) -> dict:
+    """Load what's needed to convert the selected paths of a JSON spec.
+
+    The spec is parsed incrementally: only the top level metadata, the
+    selected path items and the components they (transitively) reference
+    are built, so memory is bounded by the selection instead of the file.
+    Components referenced from components earlier in the file take
+    another pass.
+    """
+    if ijson is None:
+        logger.warning("ijson isn't installed, loading the whole spec")
+        return reduce_spec(
+            load_file(path, content_type='json'), include_paths, include_tags,
+        )
+
+    def select_paths(keys):
+        if len(keys) == 1:
+            return keys[0] in TOP_LEVEL_KEYS
+        return (
+            len(keys) == 2 and keys[0] == 'paths'
+            and include_path(keys[1], include_paths)
+        )
+
+    reduced = {'paths': {}}
+    with open(path, 'rb') as f:
+        for keys, node in iter_nodes(f, select_paths):
+            if keys[0] == 'paths':
+                node = include_operations(node, include_tags)
+                if node is not None:
+                    reduced['paths'][keys[1]] = node
+            else:
+                reduced[keys[0]] = node
+
+    found = {}
+    needed = component_keys(reduced['paths'])
+
+    def select_components(keys):
+        return (
+            len(keys) == 3 and keys[0] == 'components'
+            and keys[1:] in needed and keys[1:] not in found
+        )
+
+    while needed.difference(found):
+        found_before = len(found)
+        with open(path, 'rb') as f:
+            for keys, node in iter_nodes(f, select_components):
+                found[keys[1:]] = node
+                needed.update(component_keys(node))
+        if len(found) == found_before:
+            logger.warning(
+                f"Unresolved components: {sorted(needed.difference(found))}",
+            )
+            break
+    reduced['components'] = nest_components(found)
+    return reduced
@@ -0,0 +1,114 @@
+import random
+
+SCALAR_SCHEMAS = [
+    {'type': 'string'},
+    {'type': 'string', 'format': 'date-time'},
+    {'type': 'integer', 'minimum': 1},
+    {'type': 'number'},
+    {'type': 'boolean'},
+    {'type': 'string', 'enum': ['a', 'b', 'c']},
+]
+# In the order OpenAPIToPostman.order_routes_by_resource runs them
+VERBS = ['post', 'put', 'get', 'patch', 'delete']
+BODY_VERBS = {'post', 'put', 'patch'}
+
+
+def component_ref(i: int) -> dict:
+    return {'$ref': f'#/components/schemas/Component{i}'}
+
+
+def generate_component(
+    rng: random.Random, i: int, components: int, ref_fanout: int,
+    depth: int, cycle_ratio: float,
+) -> dict:
+    properties = {
+        f'field{p}': dict(rng.choice(SCALAR_SCHEMAS)) for p in range(3)
+    }
+    # Forward references only, so the graph is acyclic unless asked for
+    targets = range(i + 1, components)
+    for r in range(min(ref_fanout, len(targets))):
+        properties[f'ref{r}'] = component_ref(rng.choice(targets))
+    if rng.random() < cycle_ratio:
+        properties['parent'] = component_ref(i)
+    schema = {
+        'type': 'object',
+        'properties': properties,
+        'required': ['field0'],
+    }
+    # Chains of depth components, each extending the next with allOf
+    if depth > 1 and i + 1 < components and i % depth != depth - 1:
+        schema = {'allOf': [component_ref(i + 1), schema]}
+    return schema
+
+
+def generate_operation(
+    rng: random.Random, i: int, verb: str, templated: bool, components: int,
+) -> dict:
+    parameters = [{
+        'name': 'limit', 'in': 'query', 'required': False,
+        'schema': {'type': 'integer', 'minimum': 1, 'maximum': 100},
+    }]
+    if templated:
+        parameters.append({
+            'name': 'id', 'in': 'path', 'required': True,
+            'schema': {'type': 'integer', 'minimum': 1},
+        })
+    content = {'application/json': {
+        'schema': component_ref(rng.randrange(components)),
+    }} if components else None
+    operation = {
+        'operationId': f'{verb}Resource{i}{"ById" if templated else ""}',
+        'summary': f'{verb.upper()} resource {i}',
+        'tags': [f'tag{i % 10}'],
+        'parameters': parameters,
+        'responses': {
+            '200': {'description': 'OK', 'content': content},
+            'default': {'description': 'Error'},
+        },
+    }
+    if verb in BODY_VERBS and content:
+        operation['requestBody'] = {'required': True, 'content': content}
+    if not content:
+        del operation['responses']['200']['content']
+    return operation
+
+
+def generate_spec(
+    paths: int = 100, verbs_per_path: int = 2, components: int = 50,
+    ref_fanout: int = 2, depth: int = 1, cycle_ratio: float = 0.0,
+    seed: int = 0,
+) -> dict:
+    """Generate an OpenAPI 3 document, the same one for the same arguments.
+
+    paths alternate between collection (/resourceN) and item
+    (/resourceN/{id}) paths, each with verbs_per_path operations. Every
+    component has ref_fanout references to later components, allOf chains
+    depth components long, and with probability cycle_ratio a reference
+    to itself.
+    """
+    rng = random.Random(seed)
+    verbs = VERBS[:max(1, verbs_per_path)]
+    spec_paths = {}
+    for i in range(paths):
+        templated = bool(i % 2)
+        path = f'/resource{i}' + ('/{id}' if templated else '')
+        spec_paths[path] = {
+            verb: generate_operation(rng, i, verb, templated, components)
+            for verb in verbs
+        }
+    schemas = {
+        f'Component{i}': generate_component(
+            rng, i, components, ref_fanout, depth, cycle_ratio,
+        )
+        for i in range(components)
+    }
+    return {
+        'openapi': '3.0.2',
+        'info': {
+            'title': f'Synthetic {paths} paths {components} components',
+            'version': '1.0.0',
+        },
+        'servers': [{'url': 'http://localhost:8000'}],
+        'paths': spec_paths,
+        'components': {'schemas': schemas},
+    }
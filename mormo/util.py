@@ -1,5 +1,7 @@
+import asyncio
 from collections import ChainMap
 from typing import Any, Callable, Iterable, Union
+import enum
 import functools
 import importlib
 import hashlib
@@ -11,13 +13,16 @@ import re
 import secrets
 import string
 from types import GeneratorType
-import yaml
 
 import hypothesis
 from hypothesis import given
 from hypothesis_jsonschema._from_schema import from_schema
+from pydantic import BaseModel as PyDanticBaseModel
+from pydantic.json import pydantic_encoder
 
-from . import logger, redis_handle, Settings
+from .cache import LRUCache, approximate_size
+from . import codec, metrics, profile
+from . import async_redis_handle, logger, redis_handle, Settings
 
 RE_WORDCHARS = re.compile(r'^\w+$')  # noqa: W605
 
@@ -51,6 +56,45 @@ FILTERS = {
 #         return True
 
 
+def to_jsonable(obj, no_empty=True):
+    """Convert obj to what json.loads(obj.json(by_alias=True)) returns.
+
+    Models are converted using their field aliases and with no_empty None
+    values are dropped from dicts and lists, all in a single pass.
+    """
+    if obj is None or type(obj) in (str, int, float, bool):
+        return obj
+    elif isinstance(obj, PyDanticBaseModel):
+        fields = obj.__fields__
+        d = {}
+        for k, v in obj.__dict__.items():
+            if no_empty and v is None:
+                continue
+            field = fields.get(k)
+            d[field.alias if field else k] = to_jsonable(v, no_empty)
+        return d
+    elif isinstance(obj, dict):
+        return {
+            (k if isinstance(k, str) else json.dumps(k)):
+                to_jsonable(v, no_empty)
+            for k, v in obj.items()
+            if not (no_empty and v is None)
+        }
+    elif isinstance(obj, (list, tuple, set, frozenset, GeneratorType)):
+        if isinstance(obj, (set, frozenset)):
+            # pydantic copies sets before encoding, match its ordering
+            obj = set(i for i in obj)
+        return [
+            to_jsonable(i, no_empty) for i in obj
+            if not (no_empty and i is None)
+        ]
+    elif isinstance(obj, enum.Enum):
+        return to_jsonable(obj.value, no_empty)
+    elif isinstance(obj, (str, int, float)):
+        return json.loads(json.dumps(obj))
+    return to_jsonable(pydantic_encoder(obj), no_empty)
+
+
 def strip_nulls(obj):
     if isinstance(obj, (list, tuple, set)):
         return type(obj)(strip_nulls(x) for x in obj if x is not None)
@@ -65,21 +109,7 @@ def strip_nulls(obj):
 
 
 def blind_load(content):
-    load_map = {
-        'json': json.loads,
-        'yaml': yaml.safe_load,
-    }
-    if content.lstrip().startswith('{'):
-        content_type = "json"
-    else:
-        content_type = "yaml"
-    try:
-        parsed_content = load_map[content_type](content)
-    except (yaml.scanner.ScannerError, yaml.parser.ParserError, json.decoder.JSONDecodeError) as e:
-        logger.warning(e)
-        map_type = "yaml" if content_type == "json" else "json"
-        parsed_content = load_map[map_type](content)
-    return parsed_content
+    return codec.loads(content)
 
 
 def is_local_file_path(s):
@@ -95,14 +125,89 @@ def is_local_file_path(s):
 
 
 def load_file(f, content_type=None):
-    if f.endswith('.yaml') or f.endswith('.yml') or content_type == 'yaml':
-        load_f = yaml.safe_load
-    elif f.endswith('.json') or content_type == 'json':
-        load_f = json.load
-    else:
-        raise ValueError(f"Unknown file type: {f}")
-    with open(f, 'r') as fp:
-        return load_f(fp)
+    return codec.load_file(f, content_type=content_type)
+
+
+def new_cache(name: str, maxsize: int, **kwargs) -> LRUCache:
+    """A registered LRUCache limited by the cache_* settings."""
+    settings = Settings()
+    kwargs = {
+        'maxbytes': settings.cache_max_bytes, 'ttl': settings.cache_ttl,
+        **kwargs,
+    }
+    return LRUCache(maxsize=maxsize, name=name, **kwargs)
+
+
+# Parsing is much faster than measuring the document, count the file size
+FILE_CACHE = new_cache(
+    'files', Settings().file_cache_size, sizeof=lambda key, _: key[2],
+)
+
+
+def load_file_cached(f, content_type=None, scope=None):
+    """load_file, parsing the file again only once it changed.
+
+    Entries are keyed by absolute path, mtime and size. The document is
+    shared by every caller, treat it as read-only.
+    """
+    path = os.path.abspath(f)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size, content_type)
+    document = FILE_CACHE.get(key, FILE_CACHE, scope=scope)
+    if document is not FILE_CACHE:
+        profile.count('file_cache_hits')
+        return document
+    document = load_file(path, content_type=content_type)
+    FILE_CACHE.set(key, document, scope=scope)
+    return document
+
+
+def escape_json_pointer(segment: str) -> str:
+    return segment.replace('~', '~0').replace('/', '~1')
+
+
+def unescape_json_pointer(segment: str) -> str:
+    return segment.replace('~1', '/').replace('~0', '~')
+
+
+def iter_refs(o):
+    """Yield every $ref found in a nested structure of dicts and lists.
+
+    Models in it are searched too, without converting them to dicts.
+    """
+    stack = [o]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            ref = node.get('$ref')
+            if isinstance(ref, str):
+                yield ref
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, PyDanticBaseModel):
+            ref = getattr(node, 'ref', None)
+            if isinstance(ref, str):
+                yield ref
+            stack.extend(node.__dict__.values())
+
+
+def json_pointer_index(document, prefix='#'):
+    """Map the JSON pointer of every object/array in document to the node."""
+    index = {}
+    stack = [(prefix, document)]
+    while stack:
+        pointer, node = stack.pop()
+        if isinstance(node, dict):
+            children = node.items()
+        elif isinstance(node, list):
+            children = enumerate(node)
+        else:
+            continue
+        index[pointer] = node
+        for k, v in children:
+            stack.append((f"{pointer}/{escape_json_pointer(str(k))}", v))
+    return index
 
 
 def trim(s):
@@ -149,35 +254,83 @@ class DB:
     @classmethod
     def _get(cls, r, uid):
         logger.debug(f'Getting {uid} from Redis.')
-        return r.get(uid).decode('utf-8')
+        with metrics.REDIS_DURATION.time('get'):
+            return r.get(uid).decode('utf-8')
 
     @classmethod
-    def load_model_from_uid(cls, r, uid):
-        raw = cls._get(r, uid)
+    async def _get_async(cls, r, uid):
+        logger.debug(f'Getting {uid} from Redis.')
+        with metrics.REDIS_DURATION.time('get'):
+            return await r.get(uid)
+
+    @staticmethod
+    def _model_from_raw(raw):
         if raw:
             raw = json.loads(raw)
             return cls_from_str(raw['class']).construct(**raw['data'])
 
-    def save(self):
+    @classmethod
+    def load_model_from_uid(cls, r, uid):
+        return cls._model_from_raw(cls._get(r, uid))
+
+    @classmethod
+    async def load_model_from_uid_async(cls, r, uid):
+        """load_model_from_uid, only the Redis I/O runs on the event loop."""
+        raw = await cls._get_async(r, uid)
+        return await in_executor(cls._model_from_raw, raw.decode('utf-8'))
+
+    def _value(self):
         logger.debug(f'Creating {repr(self)} in Redis.')
-        return self.r.setex(
-            self.uid, self.cache_ttl,
-            self.json.encode('utf-8'),
-        )
+        value = self.json.encode('utf-8')
+        metrics.DB_OBJECT_SIZE.observe(self.klass, value=len(value))
+        return value
 
+    def save(self):
+        value = self._value()
+        with metrics.REDIS_DURATION.time('setex'):
+            return self.r.setex(self.uid, self.cache_ttl, value)
 
-def save_db(o):
-    odb = DB(redis_handle(), model=o)
-    if not odb.save():
+    async def save_async(self):
+        """save with self.r a redis.asyncio client."""
+        value = await in_executor(self._value)
+        with metrics.REDIS_DURATION.time('setex'):
+            return await self.r.setex(self.uid, self.cache_ttl, value)
+
+
+def _saved(o, odb, saved):
+    if not saved:
         raise ValueError(f"Unable to save {o}(uid: {odb.uid}) to the DB.")
     logger.debug(f"New {type(o)}: {odb.uid}")
     return o.construct(**{'id': odb.uid, 'object': o.to_dict()})
 
 
+def save_db(o):
+    odb = DB(redis_handle(), model=o)
+    return _saved(o, odb, odb.save())
+
+
 def load_db(id):
     return DB.load_model_from_uid(redis_handle(), id)
 
 
+def in_executor(f, *args):
+    """Run f in the event loop's executor, for CPU bound work."""
+    return asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(f, *args),
+    )
+
+
+async def save_db_async(o):
+    """save_db, only the Redis I/O runs on the event loop."""
+    r = async_redis_handle()
+    odb = await in_executor(functools.partial(DB, r, model=o))
+    return await in_executor(_saved, o, odb, await odb.save_async())
+
+
+async def load_db_async(id):
+    return await DB.load_model_from_uid_async(async_redis_handle(), id)
+
+
 HTTP_REASON_CLASS = {
     1: "Informational - Request received, continuing process",
     2: "Success - The action was successfully received, understood, and accepted",  # noqa: E501
@@ -226,9 +379,16 @@ def render_jinja2(template: str, **kwargs) -> str:
     return jinja2.Template(template).render(**kwargs)
 
 
-def uuidgen(*_, **__):
-    t = '-'.join(secrets.token_hex(i // 2) for i in [8, 4, 4, 4, 12])
-    return t
+def uuidgen(*_, seed=None, **__):
+    """UUID shaped id, random unless derived from a seed."""
+    if seed is None:
+        return '-'.join(secrets.token_hex(i // 2) for i in [8, 4, 4, 4, 12])
+    digest = fingerprint(seed)
+    parts, start = [], 0
+    for i in [8, 4, 4, 4, 12]:
+        parts.append(digest[start:start + i])
+        start += i
+    return '-'.join(parts)
 
 
 def gen_string(length, charset=string.printable, choice_f=random.choice):
@@ -298,30 +458,59 @@ class TemplateMap:
         return res
 
 
-def generate_from_schema(schema, no_empty=True, retry=5):
-    test_data = []
+def schema_fingerprint(schema) -> str:
+    """Fingerprint of a JSON schema that doesn't depend on key order."""
+    return fingerprint(json.dumps(schema, sort_keys=True, default=str))
+
+
+# Fingerprint of the schema -> examples drawn for it
+STRATEGY_CACHE = new_cache(
+    'strategies', Settings().strategy_cache_size,
+    sizeof=lambda key, examples: len(key) + approximate_size(examples),
+)
+
+
+def schema_with_defaults(schema):
+    """schema with mormo's data defaults, and the filter they come with."""
     settings = Settings()
+    # Schemas may be shared reference nodes, don't write defaults into them
+    schema = dict(schema)
     if (
         schema.get('type') == 'string'
         and not schema.get('minLength')
         and not schema.get('maxLength')
         and not schema.get('format')
+        and 'enum' not in schema
     ):
         schema['minLength'] = settings.test_data_str_min_length
         # schema['pattern'] = '^\w+$'
-        generate_func = from_schema(schema)
-        generate_func = generate_func.filter(FILTERS[str])
-    elif schema.get('type') == 'integer' and not schema.get('minimum'):
+        return schema, FILTERS[str]
+    elif (
+        schema.get('type') == 'integer'
+        and not schema.get('minimum')
+        and 'enum' not in schema
+    ):
         schema['minimum'] = settings.test_data_int_min
-        generate_func = from_schema(schema)
-        generate_func = generate_func.filter(FILTERS[int])
-    else:
-        generate_func = from_schema(schema)
+        return schema, FILTERS[int]
+    return schema, None
+
+
+def draw_examples(strategy, no_empty=True, retry=5, seed=None) -> list:
+    test_data = []
 
-    @given(generate_func)
+    @given(strategy)
     def f(x):
         if x or not no_empty:
             test_data.append(x)
+    if seed is not None:
+        # Nothing that depends on timing or previous runs
+        f = hypothesis.settings(
+            database=None, deadline=None,
+            suppress_health_check=list(hypothesis.HealthCheck),
+        )(hypothesis.seed(seed)(f))
+    if strategy.is_empty:
+        # Would never pass, however often it's retried
+        raise hypothesis.errors.Unsatisfiable(f"No data satisfies {strategy}")
     passed = False
     while retry > 0 or not passed:
         try:
@@ -332,40 +521,100 @@ def generate_from_schema(schema, no_empty=True, retry=5):
             retry -= 1
     if not passed:
         raise hypothesis.errors.Unsatisfiable("Max retries hit")
-    yield test_data
+    return test_data
+
+
+def generate_from_schema(
+    schema, no_empty=True, retry=5, corpus=None, seed=None, scope=None,
+):
+    """Yield a pool of examples for schema.
+
+    Examples are cached by schema fingerprint, so repeated parameter
+    shapes only build a strategy and are drawn by hypothesis once. With a
+    corpus store (see cache.store_from_uri) examples are also persisted
+    there and shared with other processes. With a seed the examples only
+    depend on the seed and schema. Entries used under a cache scope (see
+    cache.new_scope) are dropped once the scopes using them are released.
+    """
+    schema, data_filter = schema_with_defaults(schema)
+    key = schema_fingerprint([schema, no_empty, seed])
+    examples = STRATEGY_CACHE.get(key, scope=scope)
+    if examples is None:
+        examples = corpus and corpus.get(key)
+        if examples:
+            profile.count('corpus_hits')
+            examples = json.loads(examples)
+        else:
+            profile.count('hypothesis_draws')
+            with profile.stage('strategy'):
+                strategy = from_schema(schema)
+                if data_filter:
+                    strategy = strategy.filter(data_filter)
+            with profile.stage('hypothesis'):
+                examples = draw_examples(
+                    strategy, no_empty=no_empty, retry=retry,
+                    seed=None if seed is None else int(key[:16], 16),
+                )
+            if corpus:
+                save_examples(corpus, key, examples)
+        STRATEGY_CACHE.set(key, examples, scope=scope)
+    else:
+        profile.count('strategy_cache_hits')
+    yield examples
 
 
-def pick_one(gen: GeneratorType, strategy="random"):
+def save_examples(corpus, key, examples):
+    try:
+        corpus.set(key, json.dumps(examples).encode('utf-8'))
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Unable to save examples to the test data corpus: {e}")
+
+
+generate_from_schema.cache_info = STRATEGY_CACHE.stats
+generate_from_schema.cache_clear = STRATEGY_CACHE.clear
+
+
+def pick_one(gen: GeneratorType, strategy="random", rng=None):
     """Given a generator which yields an iterable, get an element."""
     # it seems that the data from generate_from_schema
     # is better if you pick randomly
     # often enough the first element is rather boring like 0 or '0'
     if "rand" in strategy.lower():
-        return random.choice(next(gen))
+        return (rng or random).choice(next(gen))
     return next(gen)[0]
 
 
-def hashable_lru(func):
-    cache = functools.lru_cache(maxsize=1024)
+def hashable_lru(func=None, maxsize=1024, ttl=None):
+    """Memoize func, with list and dict arguments keyed by their JSON.
 
-    def deserialise(value):
-        try:
-            return json.loads(value)
-        except Exception:
-            return value
-
-    def func_with_serialized_params(*args, **kwargs):
-        _args = tuple(deserialise(arg) for arg in args)
-        _kwargs = {k: deserialise(v) for k, v in kwargs.items()}
-        return func(*_args, **_kwargs)
+    Usable as @hashable_lru or @hashable_lru(maxsize=..., ttl=...). The
+    cache is registered under the function's name and limited by the
+    cache_max_bytes setting, keys included.
+    """
+    if func is None:
+        return functools.partial(hashable_lru, maxsize=maxsize, ttl=ttl)
+    cache = new_cache(
+        f'{func.__module__}.{func.__qualname__}', maxsize,
+        **({'ttl': ttl} if ttl else {}),
+    )
 
-    cached_function = cache(func_with_serialized_params)
+    def serialize(arg):
+        if type(arg) in (list, dict):
+            return json.dumps(arg, sort_keys=True)
+        return arg
 
     @functools.wraps(func)
     def lru_decorator(*args, **kwargs):
-        _args = tuple(json.dumps(arg, sort_keys=True) if type(arg) in (list, dict) else arg for arg in args)  # noqa: E501
-        _kwargs = {k: json.dumps(v, sort_keys=True) if type(v) in (list, dict) else v for k, v in kwargs.items()}  # noqa: E501
-        return cached_function(*_args, **_kwargs)
-    lru_decorator.cache_info = cached_function.cache_info
-    lru_decorator.cache_clear = cached_function.cache_clear
+        key = (
+            tuple(serialize(arg) for arg in args),
+            tuple(sorted((k, serialize(v)) for k, v in kwargs.items())),
+        )
+        result = cache.get(key, cache)
+        if result is cache:
+            result = func(*args, **kwargs)
+            cache.set(key, result)
+        return result
+    lru_decorator.cache_info = cache.stats
+    lru_decorator.cache_clear = cache.clear
+    lru_decorator.cache = cache
     return lru_decorator
@@ -0,0 +1,48 @@
+"""Compare spec loading through mormo.codec with json/yaml.safe_load.
+
+Run from the repository root so mormo is importable:
+
+    python -m scripts.bench_codec [path/to/openapi]
+"""
+import json
+import os
+import sys
+import timeit
+
+import yaml
+
+from mormo import codec
+
+
+def stdlib_load(path):
+    with open(path, 'r') as f:
+        if path.endswith('.json'):
+            return json.load(f)
+        return yaml.safe_load(f)
+
+
+def best_of(f, repeat=3):
+    return min(timeit.repeat(f, number=1, repeat=repeat))
+
+
+print(
+    f"orjson: {codec.orjson is not None},"
+    f" loader: {codec.YAMLLoader.__name__}"
+)
+data_path = sys.argv[1] if len(sys.argv) > 1 else 'tests/data/openapi'
+for content_type in ['json', 'yaml']:
+    directory = os.path.join(data_path, content_type)
+    total_old, total_new = 0, 0
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not codec.format_from_path(path):
+            continue
+        assert codec.load_file(path) == stdlib_load(path), name
+        old = best_of(lambda: stdlib_load(path))
+        new = best_of(lambda: codec.load_file(path))
+        total_old += old
+        total_new += new
+    print(
+        f"{content_type}: {total_old * 1000:.1f}ms -> {total_new * 1000:.1f}ms"
+        f" ({total_old / total_new:.1f}x)"
+    )
@@ -0,0 +1,46 @@
+"""Compare BaseModel.to_dict with the JSON round trip it replaced.
+
+Run from the repository root so mormo is importable:
+
+    python -m scripts.bench_to_dict [path/to/openapi/json]
+"""
+import json
+import os
+import sys
+import timeit
+
+from mormo.schema.openapi_v3 import OpenAPISchemaV3
+from mormo.util import strip_nulls
+
+
+def round_trip(model):
+    return strip_nulls(json.loads(model.json(by_alias=True)))
+
+
+def best_of(f, repeat=3):
+    return min(timeit.repeat(f, number=1, repeat=repeat))
+
+
+data_path = sys.argv[1] if len(sys.argv) > 1 else 'tests/data/openapi/json'
+total_old, total_new = 0, 0
+for name in sorted(os.listdir(data_path)):
+    if not name.endswith('.json'):
+        continue
+    try:
+        model = OpenAPISchemaV3.parse_file(os.path.join(data_path, name))
+    except Exception as e:
+        print(f"Skipping {name}: {type(e).__name__}")
+        continue
+    assert model.to_dict() == round_trip(model), name
+    old = best_of(lambda: round_trip(model))
+    new = best_of(model.to_dict)
+    total_old += old
+    total_new += new
+    print(
+        f"{name}: {old * 1000:.1f}ms -> {new * 1000:.1f}ms"
+        f" ({old / new:.1f}x)"
+    )
+print(
+    f"Total: {total_old * 1000:.1f}ms -> {total_new * 1000:.1f}ms"
+    f" ({total_old / total_new:.1f}x)"
+)
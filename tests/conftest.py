@@ -1,15 +1,21 @@
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import functools
+import hashlib
 import random
 import os
+import threading
 from types import GeneratorType
 from pathlib import Path
 import pytest
 
-from mormo import redis_handle
+from mormo import get_settings, redis_handle
 from mormo.convert import OpenAPIToPostman
 from mormo.model import BaseModel
 from mormo.util import DB, gen_string, hashable_lru
 
 tests_dir_path = Path(__file__).parent.absolute()
+# Validate the collections built from trusted models
+os.environ.setdefault('VALIDATE_OUTPUT', '1')
 
 
 def get_test_data(content_type, limit=3):
@@ -110,4 +116,48 @@ def test_object(request):
 @pytest.fixture
 def redis(scope='session'):
     os.environ['TESTING'] = '1'
+    get_settings.cache_clear()
     yield redis_handle()
+
+
+class ETagRequestHandler(SimpleHTTPRequestHandler):
+    """Serve files with an ETag, answering If-None-Match with a 304."""
+    requests = []
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                etag = f'"{hashlib.sha256(f.read()).hexdigest()}"'
+            self.requests.append((self.path, self.headers.get('If-None-Match')))
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return None
+            self._etag = etag
+        return super().send_head()
+
+    def end_headers(self):
+        etag = getattr(self, '_etag', None)
+        if etag:
+            self.send_header('ETag', etag)
+            self._etag = None
+        super().end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server(tmp_path):
+    """(URL, served directory, requests made) of a local HTTP server."""
+    handler = type('Handler', (ETagRequestHandler,), {'requests': []})
+    server = ThreadingHTTPServer(
+        ('127.0.0.1', 0), functools.partial(handler, directory=str(tmp_path)),
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}', tmp_path, handler.requests
+    server.shutdown()
+    server.server_close()
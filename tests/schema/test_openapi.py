@@ -2,10 +2,21 @@ import json
 import pkg_resources
 from jsonschema import validate
 
-from mormo.schema.openapi_v3 import OpenAPISchemaV3
+from mormo.schema.openapi_v3 import LazyPaths, OpenAPISchemaV3, Path
 
 def test_openapi_schema():
     openapi_schema = json.loads(pkg_resources.resource_string('mormo', '../tests/data/openapi_3.json'))
     mormo_api_schema = json.loads(pkg_resources.resource_string('mormo', '../tests/data/openapi/json/openapi.json'))
 
     validate(instance=mormo_api_schema, schema=OpenAPISchemaV3(**mormo_api_schema).to_dict())
+
+
+def test_lazy_paths():
+    mormo_api_schema = json.loads(pkg_resources.resource_string('mormo', '../tests/data/openapi/json/openapi.json'))
+    schema = OpenAPISchemaV3.lazy(mormo_api_schema)
+    assert isinstance(schema.paths, LazyPaths)
+    path = next(iter(schema.paths))
+    assert not any(isinstance(v, Path) for v in dict.values(schema.paths))
+    assert isinstance(schema.paths[path], Path)
+    assert schema.paths[path] is schema.paths.get(path)
+    assert schema.to_dict() == OpenAPISchemaV3(**mormo_api_schema).to_dict()
@@ -1,5 +1,6 @@
 import json
 import pkg_resources
+import tempfile
 from jsonschema import validate
 
 from mormo.schema.postman_collection_v2 import Script
@@ -10,6 +11,13 @@ def test_postman_schema(postman_collection):
     validate(instance=postman_collection.to_dict(), schema=postman_schema)
 
 
+def test_collection_to_file(postman_collection):
+    f = tempfile.mktemp(suffix='.json')
+    postman_collection.to_file(f)
+    with open(f) as fp:
+        assert json.load(fp) == postman_collection.to_dict()
+
+
 def test_script_add():
     a = Script(type='text/javascript', name='a', exec='a')
     b = Script(type='text/html', name='b', exec=['b', 'b1'])
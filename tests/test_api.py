@@ -0,0 +1,15 @@
+import tempfile
+
+from mormo.api import client_request, SERVER_OPTIONS
+from mormo.schema import OpenAPISchemaToPostmanRequest
+
+
+def test_client_request():
+    directory = tempfile.mkdtemp()
+    o = OpenAPISchemaToPostmanRequest(
+        host='http://localhost', item_cache=directory, http_cache=directory,
+        ir_cache=directory, test_data_corpus=directory, jobs=2,
+    )
+    request = client_request(o)
+    assert request.host == o.host
+    assert not any(getattr(request, k) for k in SERVER_OPTIONS)
@@ -0,0 +1,38 @@
+import shutil
+
+from mormo.bench import compare, find_specs, run_bench, STAGES
+from .conftest import tests_dir_path
+
+
+def test_run_bench(tmp_path):
+    shutil.copy(tests_dir_path / 'data/openapi/yaml/petstore.yaml', tmp_path)
+    (tmp_path / 'invalid.json').write_text('[]')
+    (tmp_path / 'notes.txt').write_text('')
+    specs = find_specs(str(tmp_path))
+    assert [s.split('/')[-1] for s in specs] == ['invalid.json', 'petstore.yaml']
+    report = run_bench(specs, seed=0)
+    result = report['specs'][specs[1]]
+    assert set(result['stages']) == set(STAGES)
+    assert result['items'] == 2
+    assert result['max_rss'] > 0
+    assert 'error' in report['specs'][specs[0]]
+    assert report['total']['errors'] == 1
+    assert compare(report, report) == []
+
+
+def test_compare():
+    baseline = {'specs': {
+        'a': {'wall': 1.0, 'max_rss': 100},
+        'b': {'wall': 0.01, 'max_rss': 100},
+        'c': {'wall': 1.0, 'max_rss': 100},
+        'd': {'error': 'ValidationError'},
+    }}
+    report = {'specs': {
+        'a': {'wall': 1.5, 'max_rss': 110},
+        'b': {'wall': 0.02, 'max_rss': 200},
+        'c': {'error': 'ValueError'},
+        'd': {'error': 'ValidationError'},
+    }}
+    assert [(r.spec, r.metric) for r in compare(report, baseline)] == [
+        ('a', 'wall'), ('b', 'max_rss'), ('c', 'error'),
+    ]
@@ -0,0 +1,102 @@
+import gc
+import tempfile
+import time
+
+from mormo.cache import (
+    cache_stats, new_scope, release_scope,
+    FileStore, LRUCache, MemoryStore, store_from_uri,
+)
+from mormo.convert import OpenAPIToPostman
+from mormo.util import hashable_lru, STRATEGY_CACHE
+from .conftest import tests_dir_path
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None, "Least recently used entry is evicted"
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    stats = cache.stats()
+    assert {k: stats[k] for k in ['hits', 'misses', 'evictions', 'size']} == {
+        'hits': 3, 'misses': 1, 'evictions': 1, 'size': 2,
+    }
+    assert stats['bytes'] == sum(e[1] for e in cache.data.values())
+
+
+def test_lru_cache_limits():
+    cache = LRUCache(maxbytes=100, sizeof=lambda key, value: len(value))
+    cache.set('a', 'x' * 60)
+    cache.set('b', 'x' * 30)
+    cache.set('c', 'x' * 30)
+    assert cache.get('a') is None, "Evicted to stay under maxbytes"
+    assert cache.stats()['bytes'] == 60
+    cache.set('d', 'x' * 101)
+    assert cache.get('d') is None, "Values over maxbytes aren't cached"
+    cache = LRUCache(ttl=0.01)
+    cache.set('a', 1)
+    time.sleep(0.02)
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_lru_cache_scopes():
+    cache = LRUCache(name='test_scopes')
+    assert cache_stats()['test_scopes'] == cache.stats()
+    first, second = new_scope(), new_scope()
+    cache.set('global', 1)
+    cache.set('first', 2, scope=first)
+    cache.set('shared', 3, scope=first)
+    cache.get('shared', scope=second)
+    release_scope(first)
+    assert cache.get('global') == 1
+    assert cache.get('first') is None
+    assert cache.get('shared') == 3, "Still used by the second scope"
+    release_scope(second)
+    assert cache.get('shared') is None
+
+
+def test_hashable_lru():
+    calls = []
+
+    @hashable_lru(maxsize=2)
+    def f(o, n=0):
+        calls.append(o)
+        return len(o) + n
+
+    assert f({'a': 1, 'b': 2}) == 2
+    assert f({'b': 2, 'a': 1}) == 2
+    assert f([1], n=1) == 2
+    assert len(calls) == 2
+    assert f.cache_info()['hits'] == 1
+    assert cache_stats()[f.cache.name] == f.cache_info()
+
+
+def test_conversion_scope_released():
+    path = str(tests_dir_path / 'data/openapi/yaml/petstore.yaml')
+    STRATEGY_CACHE.clear()
+    oas = OpenAPIToPostman(path=path)
+    oas.to_postman_collection_v2()
+    scope = oas.cache_scope
+    scoped = [e for e in STRATEGY_CACHE.data.values() if e[3] == {scope}]
+    assert scoped
+    del oas
+    gc.collect()
+    assert not [e for e in STRATEGY_CACHE.data.values() if e[3]]
+    with OpenAPIToPostman(path=path) as oas:
+        oas.to_postman_collection_v2()
+        assert [e for e in STRATEGY_CACHE.data.values() if e[3]]
+    assert not [e for e in STRATEGY_CACHE.data.values() if e[3]],\
+        "Released when closed, without waiting for GC"
+
+
+def test_stores(redis):
+    for store in [
+        MemoryStore(), FileStore(tempfile.mkdtemp()),
+        store_from_uri('redis', 'test'),
+    ]:
+        assert store.get('a') is None
+        store.set('a', b'1')
+        assert store.get('a') == b'1'
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+import yaml
+
+from mormo import codec
+from .conftest import tests_dir_path
+
+
+@pytest.mark.parametrize(
+    "content,expected",
+    [
+        ('{"a": 1}', 'json'),
+        (b'  [1]', 'json'),
+        ('a: 1', 'yaml'),
+        ('', 'yaml'),
+    ]
+)
+def test_detect_format(content, expected):
+    assert codec.detect_format(content) == expected
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_loads(monkeypatch, fast):
+    if not fast:
+        monkeypatch.setattr(codec, 'orjson', None)
+        monkeypatch.setattr(codec, 'YAMLLoader', yaml.SafeLoader)
+    assert codec.loads('{"a": [1, 2.5, null]}') == {'a': [1, 2.5, None]}
+    assert codec.loads(b'a:\n  - b') == {'a': ['b']}
+    # YAML flow mappings look like JSON
+    assert codec.loads('{a: 1}') == {'a': 1}
+    assert codec.loads(str(2 ** 70)) == 2 ** 70
+    assert codec.loads('{"a": %d}' % 2 ** 70) == {'a': 2 ** 70}
+
+
+@pytest.mark.parametrize(
+    "path,stdlib_load",
+    [
+        ('data/openapi/json/api2pdf.com.json', json.load),
+        ('data/openapi/yaml/petstore-expanded.yaml', yaml.safe_load),
+    ]
+)
+def test_load_file(path, stdlib_load):
+    with open(tests_dir_path / path) as f:
+        expected = stdlib_load(f)
+    assert codec.load_file(str(tests_dir_path / path)) == expected
+
+
+def test_load_file_unknown_type():
+    with pytest.raises(ValueError, match="Unknown file type"):
+        codec.load_file('schema.tf')
@@ -1,14 +1,18 @@
 from collections import defaultdict, ChainMap
+from concurrent.futures import ThreadPoolExecutor
+import io
 import tempfile
 import json
 import pytest
 from typing import Union
 
-from mormo.convert import OpenAPIToPostman as oapi2pm, ParameterBuilder, PostmanConfig, PostmanVariables, Route
+from mormo.convert import OpenAPIToPostman as oapi2pm, ParameterBuilder, PostmanConfig, PostmanVariables, Route, RouteRecord, SCHEMA_COMPONENTS_VARIABLE, compile_path
 from mormo.schema import Expect, TestData
 from mormo.schema import postman_collection_v2 as pm
-from mormo.schema.openapi_v3 import Operation, OpenAPISchemaV3, Reference, Parameter, ParameterIn
+from mormo.schema.openapi_v3 import Operation, OpenAPISchemaV3, Reference, Parameter, ParameterIn, Response as OpenAPIResponse
 from mormo.schema.postman_collection_v2 import Script
+from .conftest import tests_dir_path
+from mormo.util import generate_from_schema
 
 REF_OR_OPERATION = Union[dict, Operation, Reference]
 
@@ -453,6 +457,335 @@ def test_find_ref():
     assert oapi2pm.find_ref('#/abc/~1b~1/~0/a', {'abc': {'/b/': {'~': {'a': 1}}}}) == 1
 
 
+def test_find_ref_index():
+    node = {'type': 'string'}
+    index = {'#/components/schemas/a': node}
+    assert oapi2pm.find_ref('#/components/schemas/a', {}, ref_index=index) is node
+    assert oapi2pm.find_ref('#/b', {'b': 1}, ref_index=index) == 1
+
+
+def test_ref_index(mormo):
+    schema = mormo.schema.to_dict()
+    for pointer, node in list(mormo.ref_index.items())[:50]:
+        assert oapi2pm.find_ref(pointer, schema) == node
+
+
+def test_resolve_reused_reference():
+    param = {'$ref': '#/components/parameters/limit'}
+    schema = OpenAPISchemaV3(
+        openapi='3',
+        info={'title': 'Reuse', 'version': '1'},
+        paths={
+            f'/r{i}': {'get': {
+                'parameters': [param],
+                'responses': {'200': {'description': 'ok'}},
+            }}
+            for i in range(10)
+        },
+        components={'parameters': {'limit': {
+            'name': 'limit', 'in': 'query', 'schema': {'type': 'integer'},
+        }}},
+    )
+    mormo = oapi2pm(schema_=schema)
+    resolved = [
+        mormo._resolve_object(Reference(**param), deep=True)
+        for _ in range(10)
+    ]
+    assert resolved[0]['name'] == 'limit'
+    assert all(r is resolved[0] for r in resolved)
+    assert len(mormo.to_postman_collection_v2().item) == 10
+
+
+@pytest.mark.parametrize('strict', [True, False])
+def test_resolve_circular_reference(strict):
+    node = {
+        'type': 'object',
+        'properties': {'parent': {'$ref': '#/components/schemas/Node'}},
+    }
+    schema = OpenAPISchemaV3(
+        openapi='3', paths={}, components={'schemas': {'Node': node}},
+    )
+    mormo = oapi2pm(schema_=schema)
+    mormo.strict = strict
+    ref = Reference(**{'$ref': '#/components/schemas/Node'})
+    if strict:
+        with pytest.raises(ValueError, match='Circular reference'):
+            mormo._resolve_object(ref, deep=True)
+    else:
+        resolved = mormo._resolve_object(ref, deep=True)
+        assert resolved['properties']['parent'] == {
+            '$ref': '#/components/schemas/Node',
+        }
+    assert mormo.ref_stack == []
+
+
+def test_resolve_reference_inside_then_outside_cycle():
+    def ref(name):
+        return {'$ref': f'#/components/schemas/{name}'}
+
+    schemas = {
+        'A': {'type': 'object', 'properties': {'b': ref('B')}},
+        'B': {'type': 'object', 'properties': {'a': ref('A')}},
+    }
+    schema = OpenAPISchemaV3(
+        openapi='3', paths={}, components={'schemas': schemas},
+    )
+    mormo = oapi2pm(schema_=schema)
+    mormo.strict = False
+    a = mormo._resolve_object(Reference(**ref('A')), deep=True)
+    # B was first resolved inside A, where its cycle stops at A
+    assert a['properties']['b']['properties']['a'] == ref('A')
+    b = mormo._resolve_object(Reference(**ref('B')), deep=True)
+    # From outside, B isn't cut short but reuses the finished A
+    assert b != a['properties']['b']
+    assert b['properties']['a'] is a
+    assert mormo._resolve_object(Reference(**ref('A')), deep=True) is a
+    assert mormo.ref_stack == []
+
+
+def test_shared_schema_components():
+    content = {'application/json': {'schema': {
+        'type': 'object',
+        'properties': {'pet': {'$ref': '#/components/schemas/Pet'}},
+    }}}
+    schema = OpenAPISchemaV3(
+        openapi='3',
+        paths={'/pets': {'get': {
+            'responses': {'200': {'description': 'ok', 'content': content}},
+        }}},
+        components={'schemas': {
+            'Pet': {'type': 'object', 'properties': {
+                'owner': {'$ref': '#/components/schemas/Owner'},
+            }},
+            'Owner': {'type': 'object'},
+            'Unused': {'type': 'string'},
+        }},
+    )
+    mormo = oapi2pm(
+        schema_=schema, test_config={'GET /pets': {}},
+        shared_schema_components=True,
+    )
+    variables = {v.id: v.value for v in mormo.collection_global_variables}
+    components = json.loads(variables[SCHEMA_COMPONENTS_VARIABLE])
+    assert set(components['components']['schemas']) == {'Pet', 'Owner'}
+    validate_script = mormo.test_scripts['GET /pets'][0].exec
+    assert SCHEMA_COMPONENTS_VARIABLE in ''.join(validate_script)
+    assert 'Unused' not in ''.join(validate_script)
+
+
+def test_item_cache(monkeypatch):
+    cache_dir = tempfile.mkdtemp()
+    path = str(tests_dir_path / 'data/openapi/yaml/petstore.yaml')
+    built = []
+    build_item = oapi2pm._build_item
+
+    def counting_build_item(self, verb, path, operation):
+        built.append(f"{verb} {path}")
+        return build_item(self, verb, path, operation)
+    monkeypatch.setattr(oapi2pm, '_build_item', counting_build_item)
+
+    test_config = {'POST /pets': {}}
+    convert = lambda: oapi2pm(
+        path=path, item_cache=cache_dir, test_config=test_config,
+    ).to_postman_collection_v2()
+    first = convert()
+    assert len(built) > 1
+    built.clear()
+    second = convert()
+    assert not built, "Unchanged routes are loaded from the cache"
+    assert [i.id for i in first.item] == [i.id for i in second.item]
+    test_config['GET /pets/{petId}'] = {'test': ['console.log(1);']}
+    convert()
+    assert built == ['get /pets/{petId}'], "Only the changed route is rebuilt"
+    loaded = []
+    load_cached_item = oapi2pm.load_cached_item
+    monkeypatch.setattr(
+        oapi2pm, 'load_cached_item',
+        lambda self, key: loaded.append(key) or load_cached_item(self, key),
+    )
+    mormo = oapi2pm(path=path, item_cache=cache_dir, test_config=test_config)
+    next(mormo.iter_route_items([]))
+    assert len(loaded) == 1, "Cached items are loaded as they're reached"
+
+
+def test_parallel_route_items():
+    path = str(tests_dir_path / 'data/openapi/yaml/petstore-expanded.yaml')
+    serial = oapi2pm(path=path).to_postman_collection_v2()
+    parallel = oapi2pm(path=path, jobs=2).to_postman_collection_v2()
+    assert len(parallel.item) > 1
+    assert [i.name for i in serial.item] == [i.name for i in parallel.item]
+    assert [i.request.url.path for i in serial.item]\
+        == [i.request.url.path for i in parallel.item]
+
+
+def test_parallel_conversions_in_threads():
+    paths = [
+        str(tests_dir_path / f'data/openapi/yaml/{name}.yaml')
+        for name in ('petstore-expanded', 'uspto')
+    ]
+    expected = [
+        [i.name for i in oapi2pm(path=path).to_postman_collection_v2().item]
+        for path in paths
+    ]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        collections = list(executor.map(
+            lambda path: oapi2pm(path=path, jobs=2).to_postman_collection_v2(),
+            paths * 2,
+        ))
+    assert [[i.name for i in c.item] for c in collections] == expected * 2
+
+
+def test_seeded_conversion_is_reproducible():
+    path = str(tests_dir_path / 'data/openapi/yaml/petstore-expanded.yaml')
+    first = oapi2pm(path=path, seed=7).to_postman_collection_v2().to_dict()
+    generate_from_schema.cache_clear()
+    second = oapi2pm(path=path, seed=7, jobs=2)\
+        .to_postman_collection_v2().to_dict()
+    assert first == second
+    other = oapi2pm(path=path, seed=8).to_postman_collection_v2().to_dict()
+    assert first['info']['_postman_id'] != other['info']['_postman_id']
+
+
+def test_normalize_operation(mormo):
+    for verb, path, operation in mormo.routes:
+        ir = mormo.normalize_operation(operation)
+        assert mormo.normalize_operation(operation) is ir, "Normalized once"
+        assert ir.operation is operation
+        for param in ir.parameters:
+            assert isinstance(param, Parameter)
+        assert ir.parameters_in('path') == tuple(
+            p for p in ir.parameters if p.in_.value == 'path'
+        )
+        assert len(ir.responses) == len(operation.responses)
+        for code, response in ir.responses:
+            assert isinstance(response, OpenAPIResponse)
+
+
+def test_ir_cache():
+    cache_dir = tempfile.mkdtemp()
+    path = str(tests_dir_path / 'data/openapi/yaml/petstore-expanded.yaml')
+    first = oapi2pm(path=path, seed=3, ir_cache=cache_dir)
+    assert not any(
+        isinstance(p, dict) for p in dict.values(first.schema.paths)
+    )
+    second = oapi2pm(path=path, seed=3, ir_cache=cache_dir)
+    assert all(
+        isinstance(p, dict) for p in dict.values(second.schema.paths)
+    ), "Paths aren't validated when the IR is cached"
+    assert [r.route for r in first.route_table] == [
+        r.route for r in second.route_table
+    ]
+    assert first.to_postman_collection_v2().to_dict()\
+        == second.to_postman_collection_v2().to_dict()
+
+
+def test_filter_paths():
+    paths = {
+        '/pets': {'get': {'tags': ['pet']}, 'post': {'tags': ['admin']}},
+        '/pets/{id}': {'get': {'tags': ['pet']}},
+        '/users': {'get': {'tags': ['user']}},
+    }
+    assert list(oapi2pm.filter_paths(paths, include_paths=['/pets*'])) == [
+        '/pets', '/pets/{id}',
+    ]
+    assert oapi2pm.filter_paths(paths, include_tags=['admin']) == {
+        '/pets': {'post': {'tags': ['admin']}},
+    }
+    assert oapi2pm.filter_paths(
+        paths, include_paths=['/users'], include_tags=['pet'],
+    ) == {}
+
+
+def test_include_paths_lazy_validation():
+    path = str(tests_dir_path / 'data/openapi/yaml/petstore-expanded.yaml')
+    mormo = oapi2pm(
+        path=path, include_paths=['/pets/*'], lazy_validation=True,
+    )
+    assert list(mormo.schema.paths) == ['/pets/{id}']
+    collection = mormo.to_postman_collection_v2()
+    assert {i.request.url.path[0] for i in collection.item} == {'pets'}
+    assert all(len(i.request.url.path) == 2 for i in collection.item)
+
+
+def tagged_schema():
+    def operation(tag):
+        return {'tags': [tag], 'responses': {'200': {'description': 'ok'}}}
+    return OpenAPISchemaV3(
+        openapi='3',
+        info={'title': 'Shop', 'version': '1'},
+        paths={
+            '/pets': {'get': operation('pet'), 'post': operation('pet')},
+            '/pets/{id}': {'delete': operation('pet')},
+            '/users': {'get': operation('user')},
+            '/orders': {'get': operation('store')},
+            '/orders/{id}': {'get': operation('store')},
+        },
+    )
+
+
+@pytest.mark.parametrize("folders,expected", [
+    ('tag', {'pet': 3, 'user': 1, 'store': 1}),
+    ('resource', {'pets': 3, 'users': 1, 'orders': 1}),
+])
+def test_folders(folders, expected):
+    collection = oapi2pm(schema_=tagged_schema(), folders=folders)\
+        .to_postman_collection_v2()
+    assert all(isinstance(f, pm.Folder) for f in collection.item)
+    assert {f.name: len(f.item) for f in collection.item} == expected
+
+
+def test_balance():
+    assert oapi2pm.balance([3, 1, 1, 2], 2) == [[0, 2], [1, 3]]
+    assert oapi2pm.balance([1], 3) == [[0]]
+
+
+@pytest.mark.parametrize("shards,expected", [
+    (2, [3, 2]),
+    ('folder', [3, 1, 1]),
+])
+def test_postman_collection_shards(shards, expected):
+    mormo = oapi2pm(schema_=tagged_schema(), folders='tag', shards=shards)
+    collections = mormo.postman_collection_shards()
+    assert [sum(len(f.item) for f in c.item) for c in collections] == expected
+    assert collections[0].info.name == f'Shop (1/{len(expected)})'
+
+
+def test_postman_collection_shards_edge_cases(caplog):
+    empty = dict(tagged_schema(), paths={})
+    assert len(oapi2pm(schema_=empty, shards=2).postman_collection_shards())\
+        == 1
+    mormo = oapi2pm(
+        schema_=tagged_schema(), shards=2,
+        test_config={'GET /users': {'make_global': {'id': '.id'}}},
+    )
+    assert len(mormo.postman_collection_shards()) == 2
+    assert 'GET /users' in caplog.text
+
+
+def test_write_postman_collection_shards(tmp_path):
+    mormo = oapi2pm(schema_=tagged_schema(), shards=2, seed=1)
+    paths = mormo.write_postman_collection_shards(str(tmp_path / 'out.json'))
+    assert paths == [str(tmp_path / 'out.0.json'), str(tmp_path / 'out.1.json')]
+    names = []
+    for path in paths:
+        with open(path) as f:
+            names.extend(i['name'] for i in json.load(f)['item'])
+    collection = oapi2pm(schema_=tagged_schema(), seed=1)\
+        .to_postman_collection_v2()
+    assert sorted(names) == sorted(i.name for i in collection.item)
+
+
+def test_write_postman_collection_v2():
+    path = str(tests_dir_path / 'data/openapi/yaml/petstore-expanded.yaml')
+    f = io.StringIO()
+    oapi2pm(path=path).write_postman_collection_v2(f)
+    written = pm.Collection(**json.loads(f.getvalue()))
+    collection = oapi2pm(path=path).to_postman_collection_v2()
+    assert [i.name for i in written.item] == [i.name for i in collection.item]
+    assert [v.id for v in written.variable] == [v.id for v in collection.variable]
+    assert written.info.name == collection.info.name
+
+
 def test_path_parts():
     assert oapi2pm.path_parts('/abc/{id}') == ['abc', ':id']
     assert oapi2pm.path_parts('/project({project_id})') == ['project{{project_id}}']
@@ -553,6 +886,29 @@ def test_guess_resource():
     assert oapi2pm.guess_resource("/project({project_id})") == 'project'
 
 
+def test_compile_path():
+    compiled = compile_path('/store/{storeId}/pets({petId})')
+    assert compiled.parts == ('store', ':storeId', 'pets{{petId}}')
+    assert compiled.path_vars == ('storeId',)
+    assert compiled.segment_vars == ('petId',)
+    assert compiled.variables == ('storeId', 'petId')
+    assert compiled.resource == 'pets'
+    assert compile_path('/store/{storeId}/pets({petId})') is compiled
+
+
+def test_route_table(mormo):
+    table = mormo.route_table
+    assert table and mormo.route_table is table, "Built once per schema"
+    assert list(mormo.routes) == table
+    for record in table:
+        assert isinstance(record, RouteRecord)
+        assert not hasattr(record, '__dict__')
+        verb, path, operation = record
+        assert record.route == f'{verb.upper()} {path}'
+        assert record.parts == tuple(oapi2pm.path_parts(path))
+        assert operation is record.operation
+
+
 def test_order_routes_by_resource():
     get = Route('get', '/pets', 'getpets')
     delete = Route('delete', '/pets', 'delpets')
@@ -566,3 +922,20 @@ def test_order_routes_by_resource():
     assert oapi2pm.order_routes_by_resource(
         [delete, get, patch, put, post], verb_ordering=ordering
     ) == [post, put, get, patch, delete]
+    records = [RouteRecord(*route) for route in [get, delete, post]]
+    assert oapi2pm.order_routes_by_resource(
+        records, verb_ordering=ordering,
+    ) == [records[2], records[0], records[1]]
+
+
+def test_external_refs_skip_item_cache(mormo, monkeypatch):
+    assert not oapi2pm.external_refs({'$ref': '#/components/schemas/Pet'})
+    assert oapi2pm.external_refs({'$ref': 'pet.yaml#/Pet'})
+    assert oapi2pm.external_refs({'$ref': 'http://example.com/pet.json'})
+    assert oapi2pm.external_refs(
+        {'components': {'schemas': {'Pet': 'http://example.com/pet.json'}}},
+    )
+    verb, path, operation = next(iter(mormo.routes))
+    assert mormo.route_fingerprint(verb, path, operation)
+    monkeypatch.setattr(mormo, 'external_refs', lambda o: True)
+    assert mormo.route_fingerprint(verb, path, operation) is None
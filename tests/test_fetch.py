@@ -0,0 +1,78 @@
+import json
+
+from mormo.convert import OpenAPIToPostman
+from mormo.fetch import Fetcher
+
+
+def write_json(path, o):
+    with open(path, 'w') as f:
+        json.dump(o, f)
+
+
+def pet_spec(base_url):
+    return {
+        'openapi': '3.0.2',
+        'info': {'title': 'Pets', 'version': '1.0.0'},
+        'paths': {
+            '/pets': {'post': {
+                'requestBody': {'content': {'application/json': {
+                    'schema': {'$ref': f'{base_url}/pet.json#/Pet'},
+                }}},
+                'responses': {'200': {
+                    'description': 'OK',
+                    'content': {'application/json': {
+                        'schema': {'$ref': '#/components/schemas/Pets'},
+                    }},
+                }},
+            }},
+        },
+        'components': {'schemas': {'Pets': f'{base_url}/pets.json#/Pets'}},
+    }
+
+
+def test_fetch_once_per_fetcher(http_server):
+    url, directory, requests = http_server
+    write_json(directory / 'pet.json', {'Pet': {'type': 'object'}})
+    fetcher = Fetcher()
+    assert fetcher.load(f'{url}/pet.json#/Pet') == {'Pet': {'type': 'object'}}
+    assert fetcher.load(f'{url}/pet.json') is fetcher.load(f'{url}/pet.json')
+    assert requests == [('/pet.json', None)]
+
+
+def test_fetch_revalidates_disk_cache(http_server, tmp_path_factory):
+    url, directory, requests = http_server
+    cache_dir = str(tmp_path_factory.mktemp('http_cache'))
+    write_json(directory / 'pet.json', {'Pet': {'type': 'object'}})
+    content = Fetcher(cache_dir=cache_dir).get(f'{url}/pet.json')
+    # A new run asks if it changed and gets the cached body back
+    assert Fetcher(cache_dir=cache_dir).get(f'{url}/pet.json') == content
+    assert requests[1][1] is not None
+    write_json(directory / 'pet.json', {'Pet': {'type': 'string'}})
+    assert Fetcher(cache_dir=cache_dir).load(f'{url}/pet.json') == {
+        'Pet': {'type': 'string'},
+    }
+
+
+def test_convert_prefetches_remote_refs(http_server):
+    url, directory, requests = http_server
+    write_json(directory / 'pet.json', {'Pet': {
+        'type': 'object',
+        'properties': {'name': {'type': 'string'}},
+        'required': ['name'],
+    }})
+    write_json(directory / 'pets.json', {'Pets': {'type': 'array'}})
+    oas = OpenAPIToPostman(schema=pet_spec(url))
+    assert sorted(r[0] for r in requests) == ['/pet.json', '/pets.json']
+    assert oas.resolve_reference(f'{url}/pet.json#/Pet')['type'] == 'object'
+    assert oas.resolve_reference('#/components/schemas/Pets') == {
+        'type': 'array',
+    }
+    fake_data = oas.fake_data_from_route_schema(
+        'post', '/pets', oas.schema.paths['/pets'].post,
+    )
+    assert isinstance(fake_data.requestBody['name'], str)
+    assert len(requests) == 2
+    pools = oas.fetcher.session.get_adapter(url).poolmanager.pools
+    assert len(pools) == 1
+    oas.close()
+    assert len(pools) == 0
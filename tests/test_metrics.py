@@ -0,0 +1,80 @@
+from fastapi.testclient import TestClient
+
+from mormo import metrics
+from mormo.api import app
+from mormo.util import load_file
+from .conftest import tests_dir_path
+
+
+def test_histogram():
+    h = metrics.Histogram('h', 'Test.', labels=('a',), buckets=(1, 2))
+    h.observe('x"', value=1.5)
+    h.observe('x"', value=3)
+    assert h.render() == [
+        '# HELP h Test.',
+        '# TYPE h histogram',
+        'h_bucket{a="x\\"",le="1"} 0',
+        'h_bucket{a="x\\"",le="2"} 1',
+        'h_bucket{a="x\\"",le="+Inf"} 2',
+        'h_count{a="x\\""} 2',
+        'h_sum{a="x\\""} 4.5',
+    ]
+
+
+def test_counter():
+    c = metrics.Counter('c', 'Test.')
+    c.inc()
+    c.inc(n=2)
+    assert c.render()[-1] == 'c 3.0'
+
+
+def test_metrics_endpoint(redis):
+    client = TestClient(app)
+    spec = load_file(str(tests_dir_path / 'data/openapi/yaml/petstore.yaml'))
+    digest = client.post('/schema', json=spec).json()['id']
+    assert client.post(f'/schema/{digest}/to_postman').status_code == 200
+    response = client.get('/metrics')
+    assert response.headers['content-type'].startswith(metrics.CONTENT_TYPE)
+    lines = response.text.splitlines()
+    assert 'mormo_http_request_duration_seconds_count{method="POST",'\
+        'route="/schema/{digest}/to_postman",status="200"} 1' in lines
+    for prefix in [
+        'mormo_conversion_stage_seconds_count{stage="item"}',
+        'mormo_conversion_events_total{event="items_built"}',
+        'mormo_redis_operation_duration_seconds_count{operation="setex"}',
+        'mormo_redis_operation_duration_seconds_count{operation="get"}',
+        'mormo_db_object_bytes_count{class="mormo.schema.openapi_v3.OpenAPISchemaV3"}',
+        'mormo_cache{cache="strategies",stat="hits"}',
+    ]:
+        assert any(line.startswith(prefix) for line in lines), prefix
+
+
+def test_newman_metrics(monkeypatch):
+    import subprocess
+    from mormo import postman_test
+
+    def run(**kwargs):
+        return subprocess.CompletedProcess(kwargs['args'], 1, b'', b'')
+    monkeypatch.setattr(postman_test.subprocess, 'run', run)
+    before = metrics.NEWMAN_RUNS.values[(1,)]
+    assert postman_test.run_newman('collection.json').code == 1
+    assert metrics.NEWMAN_RUNS.values[(1,)] == before + 1
+    assert metrics.NEWMAN_DURATION.values[()][-2] >= 1
+
+
+def test_concurrent_requests(redis):
+    import asyncio
+    import httpx
+
+    async def requests():
+        async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+            spec = load_file(
+                str(tests_dir_path / 'data/openapi/yaml/petstore.yaml'),
+            )
+            digest = (await client.post('/schema', json=spec)).json()['id']
+            return await asyncio.gather(*[
+                client.get(f'/schema/{digest}') for _ in range(20)
+            ])
+    responses = asyncio.run(requests())
+    assert {r.status_code for r in responses} == {200}
+    assert len({r.text for r in responses}) == 1
@@ -1,7 +1,17 @@
+import asyncio
 import tempfile
 import json
+
+import pydantic
+import pytest
+
+from mormo import async_redis_handle, redis_handle
 from mormo.model import BaseModel
-from mormo.util import load_db, save_db, cls_from_str, DB
+from mormo.schema.postman_collection_v2 import Parameter, Url
+from mormo.util import (
+    load_db, load_db_async, save_db, save_db_async, cls_from_str,
+    strip_nulls, DB,
+)
 
 
 def test_cls_from_str():
@@ -47,3 +57,41 @@ def test_get_safe(test_object):
     k = '*'*10 # longer than any keys generated by test_dict
     assert test_object.get_safe(k) == None
     #assert test_object.get_safe(k, {}) == {}
+
+
+def test_to_dict_matches_json_round_trip(mormo):
+    for no_empty in (True, False):
+        expected = json.loads(mormo.schema.json(by_alias=True))
+        if no_empty:
+            expected = strip_nulls(expected)
+        assert mormo.schema.to_dict(no_empty=no_empty) == expected
+
+
+def test_trusted():
+    url = Url.trusted(path=['pets'], host=['{{baseUrl}}'], query=[], variable=[])
+    assert url.to_dict(no_empty=False) == Url(**url.to_dict(no_empty=False)).to_dict(no_empty=False)
+    assert Parameter.trusted(key='a', value='1').disabled is False, "Defaults are set"
+    assert Parameter.trusted(key='a', value='1').validated() == Parameter(key='a', value='1')
+    with pytest.raises(pydantic.ValidationError):
+        Parameter.trusted(key='a', value=None).validated()
+
+
+def test_save_db_async(test_object, redis):
+    test_object, expected = test_object
+
+    async def save_and_load():
+        o = await save_db_async(test_object)
+        return o, await load_db_async(o.id)
+    o, loaded = asyncio.run(save_and_load())
+    assert loaded == expected
+    assert load_db(o.id) == expected, "Shared with the sync client"
+
+
+def test_redis_handle_pooled(redis):
+    assert redis_handle() is redis
+
+    async def handles():
+        return async_redis_handle(), async_redis_handle()
+    first, second = asyncio.run(handles())
+    assert first is second
+    assert asyncio.run(handles())[0] is not first, "One per event loop"
@@ -1,4 +1,4 @@
-from mormo.postman_test import javascript, new_event
+from mormo.postman_test import javascript, new_event, run_newman_shards
 from mormo.schema.postman_collection_v2 import Script
 
 
@@ -22,3 +22,7 @@ def test_run_newman(postman_collection):
     res = postman_collection.run(host=None, json=True)
     error = res.json_['run']['failures'][0]['error']['message'].lower()
     assert 'invalid uri' in error or 'enotfound' in error
+
+
+def test_run_newman_shards_empty():
+    assert run_newman_shards([]).code == 0
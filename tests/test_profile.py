@@ -0,0 +1,61 @@
+import asyncio
+
+from mormo import profile
+from mormo.api import schema_to_postman
+from mormo.convert import OpenAPIToPostman
+from mormo.schema.openapi_v3 import OpenAPISchemaV3
+from mormo.util import load_file, save_db
+from .conftest import tests_dir_path
+
+SPEC_PATH = str(tests_dir_path / 'data/openapi/yaml/petstore-expanded.yaml')
+
+
+def test_stage_and_count():
+    with profile.stage('a'):
+        profile.count('b')
+    with profile.profiling() as profiler:
+        for _ in range(2):
+            with profile.stage('a'):
+                profile.count('b', 2)
+    report = profiler.report()
+    assert report['stages']['a']['calls'] == 2
+    assert report['stages']['total']['calls'] == 1
+    assert report['counters'] == {'b': 4}
+    assert profile.CURRENT.get() is None
+
+
+def test_profiled_call():
+    def f():
+        profile.count('c')
+        return 1
+    assert profile.profiled_call(f) == (1, None)
+    with profile.profiling() as profiler:
+        result, report = profile.profiled_call(f)
+        assert profiler.counters == {}
+        profile.merge(report)
+    assert result == 1
+    assert profiler.counters == {'c': 1}
+
+
+def test_profile_conversion():
+    with profile.profiling() as profiler:
+        OpenAPIToPostman(path=SPEC_PATH, seed=0).to_postman_collection_v2()
+    stages = profiler.report()['stages']
+    for name in ['load', 'validate', 'item', 'parameters', 'collection']:
+        assert stages[name]['calls']
+    assert profiler.counters['items_built'] == 3
+    assert profiler.counters['refs_resolved']
+    with profile.profiling() as parallel:
+        OpenAPIToPostman(path=SPEC_PATH, seed=0, jobs=2)\
+            .to_postman_collection_v2()
+    assert parallel.counters['items_built'] == 3
+    assert parallel.calls['item'] == 3
+
+
+def test_api_server_timing(redis):
+    digest = save_db(OpenAPISchemaV3(**load_file(SPEC_PATH))).id
+    response = asyncio.run(schema_to_postman(digest))
+    stages = [
+        t.split(';')[0] for t in response.headers['Server-Timing'].split(', ')
+    ]
+    assert {'total', 'load', 'item'} <= set(stages)
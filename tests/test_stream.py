@@ -0,0 +1,78 @@
+import json
+import logging
+
+import pytest
+
+from mormo import stream
+from mormo.convert import OpenAPIToPostman
+from .conftest import tests_dir_path
+
+SPEC_PATH = str(tests_dir_path / 'data/openapi/json/openapi.json')
+
+
+def spec_with_back_reference(tmp_path):
+    spec = {
+        'openapi': '3.0.2',
+        'info': {'title': 'Test', 'version': '1'},
+        'paths': {
+            '/a': {'get': {'tags': ['a'], 'responses': {'200': {
+                'description': 'ok', 'content': {'application/json': {
+                    'schema': {'$ref': '#/components/schemas/A'},
+                }},
+            }}}},
+            '/b.v1': {'get': {'tags': ['b'], 'responses': {}}},
+        },
+        'components': {'schemas': {
+            'C': {'type': 'number'},
+            'A': {'type': 'array', 'items': {'$ref': '#/components/schemas/B'}},
+            'B': {'type': 'object', 'properties': {
+                'c': {'$ref': '#/components/schemas/C'},
+                'b': {'$ref': '#/components/schemas/B'},
+            }},
+            'Unused': {'type': 'string'},
+        }},
+    }
+    path = tmp_path / 'spec.json'
+    path.write_text(json.dumps(spec))
+    return spec, str(path)
+
+
+def test_reduce_spec(tmp_path):
+    spec, _ = spec_with_back_reference(tmp_path)
+    reduced = stream.reduce_spec(spec, include_paths=['/a'])
+    assert list(reduced['paths']) == ['/a']
+    assert set(reduced['components']['schemas']) == {'A', 'B', 'C'}
+    assert stream.reduce_spec(spec, include_tags=['b'])['paths'] == {
+        '/b.v1': spec['paths']['/b.v1'],
+    }
+
+
+@pytest.mark.parametrize("incremental", [True, False])
+def test_load_spec_subset(monkeypatch, tmp_path, incremental):
+    if incremental:
+        pytest.importorskip('ijson')
+    else:
+        monkeypatch.setattr(stream, 'ijson', None)
+    spec, path = spec_with_back_reference(tmp_path)
+    for include_paths in [['/a'], ['/b.v1'], None]:
+        assert stream.load_spec_subset(path, include_paths)\
+            == stream.reduce_spec(spec, include_paths)
+    with open(SPEC_PATH) as f:
+        spec = json.load(f)
+    assert stream.load_spec_subset(SPEC_PATH, ['/schema/*'])\
+        == stream.reduce_spec(spec, ['/schema/*'])
+
+
+def test_streaming_conversion():
+    collection = OpenAPIToPostman(
+        path=SPEC_PATH, streaming=True, include_paths=['/schema/{digest}'],
+    ).to_postman_collection_v2()
+    assert [i.request.url.path for i in collection.item]\
+        == [['schema', ':digest']]
+
+
+def test_streaming_yaml_warns(caplog):
+    path = str(tests_dir_path / 'data/openapi/yaml/petstore.yaml')
+    with caplog.at_level(logging.WARNING):
+        OpenAPIToPostman(path=path, streaming=True)
+    assert 'Streaming only parses JSON' in caplog.text
@@ -0,0 +1,35 @@
+import pytest
+
+from mormo.schema.openapi_v3 import OpenAPISchemaV3
+from mormo.synthetic import generate_spec
+from mormo.util import iter_refs
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {'paths': 7, 'verbs_per_path': 5, 'components': 20, 'ref_fanout': 4},
+    {'components': 12, 'depth': 4, 'cycle_ratio': 0.5},
+    {'paths': 3, 'components': 0},
+])
+def test_generate_spec(kwargs):
+    spec = generate_spec(**kwargs)
+    assert spec == generate_spec(**kwargs)
+    OpenAPISchemaV3(**spec)
+    assert len(spec['paths']) == kwargs.get('paths', 100)
+    schemas = spec['components']['schemas']
+    assert len(schemas) == kwargs.get('components', 50)
+    for ref in iter_refs(spec):
+        assert ref.split('/')[-1] in schemas
+
+
+def test_generate_spec_shape():
+    assert generate_spec(seed=1) != generate_spec(seed=2)
+    schemas = generate_spec(components=9, depth=3, cycle_ratio=1)\
+        ['components']['schemas']
+    assert [i for i in range(9) if 'allOf' in schemas[f'Component{i}']]\
+        == [0, 1, 3, 4, 6, 7]
+    for name, schema in schemas.items():
+        schema = schema['allOf'][1] if 'allOf' in schema else schema
+        assert schema['properties']['parent'] == {
+            '$ref': f'#/components/schemas/{name}',
+        }
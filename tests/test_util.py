@@ -6,20 +6,27 @@ import yaml
 
 import pytest
 
+import mormo.util
+from mormo.cache import store_from_uri
 from mormo.util import (
     blind_load,
     cls_from_str,
     fingerprint,
     flatten_iterables_in_dict,
     gen_string,
+    generate_from_schema,
     get_http_reason,
+    json_pointer_index,
     load_file,
+    load_file_cached,
     pick_one,
     uuidgen,
     strip_nulls,
+    to_jsonable,
     TemplateMap,
     trim,
 )
+from mormo.schema.openapi_v3 import OpenAPISchemaV3, ParameterIn
 from .conftest import generate_dict_expected
 
 
@@ -72,6 +79,26 @@ def test_strip_nulls():
     }
 
 
+def test_to_jsonable():
+    mormo_schema = OpenAPISchemaV3(
+        openapi='3',
+        paths={'/a/{id}': {'get': {
+            'parameters': [{
+                'in': 'path', 'name': 'id', 'required': True,
+                'schema': {'type': 'string'},
+            }],
+            'responses': {200: {'description': 'ok', 'headers': None}},
+        }}},
+        components={'schemas': {'a': {'enum': {1}, 'x': (None, 1), 2: None}}},
+    )
+    expected = json.loads(mormo_schema.json(by_alias=True))
+    assert to_jsonable(mormo_schema, no_empty=False) == expected
+    assert to_jsonable(mormo_schema) == strip_nulls(expected)
+    assert to_jsonable(ParameterIn.path) == 'path'
+    assert to_jsonable({1: None, 1.5: 'a', None: 'b'}, no_empty=False)\
+        == {'1': None, '1.5': 'a', 'null': 'b'}
+
+
 def test_load_file(random_dict):
     f_map = {
         '.json': {'dump': json.dumps, 'load': json.load},
@@ -89,12 +116,32 @@ def test_load_file(random_dict):
     assert load_file(x, content_type='json') == random_dict, "File loaded by specified content type"
 
 
+def test_load_file_cached(tmp_path):
+    path = tmp_path / 'variables.json'
+    path.write_text(json.dumps({'a': 1}))
+    first = load_file_cached(str(path))
+    hits = mormo.util.FILE_CACHE.hits
+    assert load_file_cached(str(path)) is first
+    assert mormo.util.FILE_CACHE.hits == hits + 1
+    path.write_text(json.dumps({'a': 22}))
+    assert load_file_cached(str(path)) == {'a': 22}, "Changed files are reloaded"
+
+
 def test_load_file_invalid_type():
     with pytest.raises(ValueError) as exc:
         load_file("schema.tf")
     assert "Unknown file type" in str(exc)
 
 
+def test_json_pointer_index():
+    doc = {'schemas': {'a/b': {'c~': [{'d': 1}]}}}
+    index = json_pointer_index(doc, prefix='#/components')
+    assert index['#/components'] is doc
+    assert index['#/components/schemas/a~1b/c~0'] == [{'d': 1}]
+    assert index['#/components/schemas/a~1b/c~0/0'] == {'d': 1}
+    assert '#/components/schemas/a~1b/c~0/0/d' not in index, "Scalars aren't indexed"
+
+
 def test_trim():
     assert trim(" a ") == "a"
     assert trim("   a  ") == "a"
@@ -128,6 +175,12 @@ def test_secure_uuidgen_behaves_like_uuid1():
         assert get_lens(uuidgen()) == get_lens(uuid.uuid1())
 
 
+def test_seeded_uuidgen():
+    assert uuidgen(seed=[1, 'a']) == uuidgen(seed=[1, 'a'])
+    assert uuidgen(seed=[1, 'a']) != uuidgen(seed=[1, 'b'])
+    assert get_lens(uuidgen(seed=1)) == get_lens(uuid.uuid1())
+
+
 @pytest.mark.parametrize("charset", [string.printable, string.digits, string.ascii_letters])
 def test_gen_string(charset):
     s = gen_string(10, charset=charset)
@@ -189,3 +242,49 @@ def test_template_map():
 
 def test_pick_one():
     assert pick_one((n for n in [range(10), range(10)])) in range(10)
+
+
+def test_generate_from_schema_cache(monkeypatch):
+    generate_from_schema.cache_clear()
+    built = []
+    from_schema = mormo.util.from_schema
+    monkeypatch.setattr(
+        mormo.util, 'from_schema',
+        lambda schema: built.append(schema) or from_schema(schema),
+    )
+    examples = next(generate_from_schema({'type': 'integer', 'maximum': 50}))
+    assert examples
+    assert generate_from_schema.cache_info()['misses'] == 1
+    assert next(generate_from_schema({'maximum': 50, 'type': 'integer'})) is examples
+    assert generate_from_schema.cache_info()['hits'] == 1
+    assert pick_one(generate_from_schema({'type': 'integer', 'maximum': 50})) in examples
+    assert len(built) == 1, "Strategies are only built on a miss"
+
+
+@pytest.mark.parametrize("corpus", ['directory', 'redis'])
+def test_generate_from_schema_corpus(corpus, redis, monkeypatch):
+    corpus = store_from_uri(
+        tempfile.mkdtemp() if corpus == 'directory' else corpus, 'test_data',
+    )
+    schema = {'type': 'string', 'maxLength': 8, 'pattern': gen_string(4, string.ascii_letters)}
+    generate_from_schema.cache_clear()
+    examples = next(generate_from_schema(schema, corpus=corpus))
+    generate_from_schema.cache_clear()
+
+    def draw_examples(*args, **kwargs):
+        raise AssertionError("Examples are drawn again")
+    monkeypatch.setattr(mormo.util, 'draw_examples', draw_examples)
+    assert next(generate_from_schema(schema, corpus=corpus)) == examples
+
+
+def test_generate_from_schema_enum(monkeypatch):
+    monkeypatch.setenv('TEST_DATA_STR_MIN_LENGTH', '3')
+    examples = next(generate_from_schema({'type': 'string', 'enum': ['a', 'b']}))
+    assert set(examples) <= {'a', 'b'}
+
+
+def test_draw_examples_unsatisfiable():
+    import hypothesis
+    from hypothesis.strategies import nothing
+    with pytest.raises(hypothesis.errors.Unsatisfiable):
+        mormo.util.draw_examples(nothing(), retry=2)